@@ -16,17 +16,50 @@ class EditorConfig:
     # 定义固定的卡片尺寸
     CARD_WIDTH = 200   
     CARD_HEIGHT = 240  
+    CARD_PAD = 5
+    
+    # 虚拟网格：列数 / 可视区外预留行数 / 滚轮步长 (px)
+    GRID_COLS = 5
+    GRID_OVERSCAN_ROWS = 2
+    SCROLL_STEP = 60
     
     # 图片的最大限制尺寸
     IMG_MAX_SIZE = 160 
+    
+    # 缩略图缓存：磁盘预算 (MB) / 内存条目上限
+    THUMB_CACHE_MB = 256
+    THUMB_MEMORY_ENTRIES = 300
+    
+    # 多进程渲染：进程数 (None = CPU 核数) / 每批页数
+    RENDER_WORKERS = None
+    RENDER_BATCH = 16
+    
+    # 第一遍快速预览的最长边 (px)，随后再升级为 IMG_MAX_SIZE
+    PREVIEW_SIZE = 48
 
 class MergerConfig:
     APP_NAME = f"PDF合并 v{GlobalConfig.APP_VERSION}"
     APP_SIZE = "900x700"
+    
+    # 元数据探测进程数 (None = 按 CPU 核数，最多 8)
+    PROBE_WORKERS = None
+    
+    # 输入总大小超过此值时改用有界内存的流式合并
+    STREAMING_THRESHOLD_MB = 512
+    MAX_MEMORY_MB = 1024
+    
+    # 文件数超过此值时改用多进程分层合并
+    PARALLEL_THRESHOLD_FILES = 200
+    MERGE_WORKERS = None
+    MERGE_GROUP_SIZE = 64
 
 class PaginatorConfig:
     APP_NAME = f"PDF页码 v{GlobalConfig.APP_VERSION}"
     APP_SIZE = "1100x850"
+    
+    # 页数达到此值时按页段分片、多进程盖章 (None = 按 CPU 核数)
+    SHARD_MIN_PAGES = 2000
+    WORKERS = None
 
 class Img2PdfConfig:
     APP_NAME = f"图片转PDF v{GlobalConfig.APP_VERSION}"
@@ -39,5 +72,14 @@ class Img2PdfConfig:
     TEXT_H = 20
     
     INITIAL_LOAD_COUNT = 30 
+    
+    # 体积控制：抽样张数、允许误差、每页固定开销估算、超出时最多补救几轮
+    PLAN_SAMPLES = 12
+    TARGET_TOLERANCE = 0.05
+    PAGE_OVERHEAD_KB = 2
+    PLAN_PASSES = 3
+    
+    # 常驻编码进程数 (None = CPU 核数)
+    WORKERS = None
 
  
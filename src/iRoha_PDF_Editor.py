@@ -1,178 +1,30 @@
 import os
-import threading
-import fitz  # PyMuPDF
+import math
 import customtkinter as ctk
 import tkinter as tk
 from tkinter import filedialog, messagebox
 from tkinterdnd2 import DND_FILES
 from PIL import Image
-from concurrent.futures import ThreadPoolExecutor
-import concurrent.futures
 from settings_manager import SettingsManager
 
 # ==============================================================================
 # 配置
 # ==============================================================================
 from config import EditorConfig as Config
-from utils import save_pdf_optimized, render_page_to_image
 
 # ==============================================================================
-# 后端逻辑
+# 后端逻辑 (见 iroha.editor)
 # ==============================================================================
-
-from abc import ABC, abstractmethod
-from typing import List, Any
-
-# --- Command Pattern ---
-class Command(ABC):
-    """Abstract base class for undoable commands."""
-    @abstractmethod
-    def execute(self) -> None:
-        pass
-    
-    @abstractmethod
-    def undo(self) -> None:
-        pass
-
-class RotatePageCommand(Command):
-    """Command to rotate a page."""
-    def __init__(self, backend: 'PDFBackend', current_index: int, angle: int):
-        self.backend = backend
-        self.current_index = current_index
-        self.angle = angle
-    
-    def execute(self) -> None:
-        orig_idx = self.backend.get_original_index(self.current_index)
-        if orig_idx == -1: return
-        page = self.backend.doc[orig_idx]
-        page.set_rotation(page.rotation + self.angle)
-    
-    def undo(self) -> None:
-        orig_idx = self.backend.get_original_index(self.current_index)
-        if orig_idx == -1: return
-        page = self.backend.doc[orig_idx]
-        page.set_rotation(page.rotation - self.angle)
-
-class DeletePageCommand(Command):
-    """Command to delete a page (stores mapping for undo)."""
-    def __init__(self, backend: 'PDFBackend', current_index: int):
-        self.backend = backend
-        self.current_index = current_index
-        self.deleted_mapping: int = -1  # Store the original page index
-    
-    def execute(self) -> None:
-        if 0 <= self.current_index < len(self.backend.page_mapping):
-            self.deleted_mapping = self.backend.page_mapping.pop(self.current_index)
-    
-    def undo(self) -> None:
-        if self.deleted_mapping != -1:
-            self.backend.page_mapping.insert(self.current_index, self.deleted_mapping)
-
-# --- Backend ---
-class PDFBackend:
-    def __init__(self):
-        self.doc = None
-        self.file_path = None
-        self.page_mapping: List[int] = [] 
-        self.clipboard: List[int] = []
-        self.undo_stack: List[Command] = []
-        self.redo_stack: List[Command] = []
-
-    def load(self, path: str) -> None:
-        self.file_path = path
-        self.doc = fitz.open(path)
-        self.page_mapping = list(range(len(self.doc)))
-        self.undo_stack.clear()
-        self.redo_stack.clear()
-
-    def get_page_count(self) -> int:
-        return len(self.page_mapping) if self.doc else 0
-
-    def get_original_index(self, current_index: int) -> int:
-        if 0 <= current_index < len(self.page_mapping):
-            return self.page_mapping[current_index]
-        return -1
-
-    def is_landscape(self, current_index: int) -> bool:
-        if not self.doc: return False
-        try:
-            orig_idx = self.get_original_index(current_index)
-            page = self.doc[orig_idx]
-            rect = page.rect 
-            return rect.width > rect.height
-        except: return False
-
-    # --- Command Execution ---
-    def execute_command(self, cmd: Command) -> None:
-        """Execute a command and push to undo stack."""
-        cmd.execute()
-        self.undo_stack.append(cmd)
-        self.redo_stack.clear()  # Clear redo stack on new action
-
-    def undo(self) -> bool:
-        """Undo last command. Returns True if successful."""
-        if not self.undo_stack:
-            return False
-        cmd = self.undo_stack.pop()
-        cmd.undo()
-        self.redo_stack.append(cmd)
-        return True
-
-    def redo(self) -> bool:
-        """Redo last undone command. Returns True if successful."""
-        if not self.redo_stack:
-            return False
-        cmd = self.redo_stack.pop()
-        cmd.execute()
-        self.undo_stack.append(cmd)
-        return True
-
-    def can_undo(self) -> bool:
-        return len(self.undo_stack) > 0
-
-    def can_redo(self) -> bool:
-        return len(self.redo_stack) > 0
-
-    # --- Legacy methods (still used by cut/paste) ---
-    def rotate_page(self, current_index: int, angle: int) -> None:
-        cmd = RotatePageCommand(self, current_index, angle)
-        self.execute_command(cmd)
-
-    def delete_page(self, current_index: int) -> None:
-        cmd = DeletePageCommand(self, current_index)
-        self.execute_command(cmd)
-
-    def cut_pages(self, current_indices) -> List[int]:
-        sorted_indices = sorted(list(current_indices), reverse=True)
-        cut_items = []
-        for idx in sorted_indices:
-            if 0 <= idx < len(self.page_mapping):
-                cut_items.append(self.page_mapping.pop(idx))
-        return cut_items[::-1]
-
-    def paste_pages(self, target_current_index: int, items: List[int]) -> None:
-        for item in reversed(items):
-            self.page_mapping.insert(target_current_index, item)
-
-    def save(self, save_path: str) -> None:
-        if not self.doc: return
-        new_doc = fitz.open()
-        for orig_idx in self.page_mapping:
-            new_doc.insert_pdf(self.doc, from_page=orig_idx, to_page=orig_idx)
-        
-        save_pdf_optimized(new_doc, save_path)
-        new_doc.close()
-
-    def render_thumbnail(self, orig_idx: int):
-        if not self.doc or orig_idx == -1: return None
-        return render_page_to_image(self.doc[orig_idx], Config.IMG_MAX_SIZE)
+from iroha.editor import PDFBackend
+from iroha.thumbcache import ThumbnailCache
+from iroha.render import RenderService, RenderScheduler
 
 
 # ==============================================================================
 # UI 组件：固定尺寸卡片
 # ==============================================================================
 class PageCard(ctk.CTkFrame):
-    def __init__(self, master, index, backend, select_callback, menu_callback):
+    def __init__(self, master, index, backend, select_callback, menu_callback, scroll_callback=None):
         super().__init__(
             master, 
             width=Config.CARD_WIDTH, 
@@ -190,6 +42,8 @@ class PageCard(ctk.CTkFrame):
         self.select_callback = select_callback
         self.menu_callback = menu_callback
         self.is_selected = False
+        self.has_full_image = False
+        self.orig_idx = -1
 
         # 布局
         self.grid_columnconfigure(0, weight=1)
@@ -208,6 +62,9 @@ class PageCard(ctk.CTkFrame):
         for w in [self, self.lbl_img, self.lbl_num]:
             w.bind("<Button-1>", self.on_click)
             w.bind("<Button-3>", self.on_right_click)
+            if scroll_callback:
+                for seq in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+                    w.bind(seq, scroll_callback)
             
         self.refresh_text_ui() 
 
@@ -225,15 +82,27 @@ class PageCard(ctk.CTkFrame):
             col = "#D35400"
         self.lbl_num.configure(text=txt, text_color=col if not self.is_selected else "#1F6AA5")
 
-    def set_image(self, pil_image):
+    def set_image(self, pil_image, preview=False):
         if not self.winfo_exists() or not pil_image: return
+        if preview and self.has_full_image: return
         try:
-            ctk_img = ctk.CTkImage(light_image=pil_image, dark_image=pil_image, size=pil_image.size)
+            size = pil_image.size
+            if preview:
+                # 低分辨率预览按缩略图尺寸放大显示
+                scale = Config.IMG_MAX_SIZE / max(size)
+                size = (int(size[0] * scale), int(size[1] * scale))
+            ctk_img = ctk.CTkImage(light_image=pil_image, dark_image=pil_image, size=size)
             self.lbl_img.configure(image=ctk_img, text="")
             self.lbl_img._image = ctk_img 
+            self.has_full_image = not preview
             self.refresh_text_ui()
         except: pass
 
+    def show_placeholder(self):
+        if not self.winfo_exists(): return
+        self.has_full_image = False
+        self.lbl_img.configure(image=None, text="加载中...")
+
     def set_selected(self, selected):
         if not self.winfo_exists(): return
         self.is_selected = selected
@@ -260,11 +129,16 @@ class EditorFrame(ctk.CTkFrame):
     def __init__(self, master):
         super().__init__(master)
         
-        self.backend = PDFBackend()
+        self.thumb_cache = ThumbnailCache(max_bytes=Config.THUMB_CACHE_MB * 1024 * 1024,
+                                          max_entries=Config.THUMB_MEMORY_ENTRIES)
+        self.render_service = RenderService(max_workers=Config.RENDER_WORKERS, batch_size=Config.RENDER_BATCH)
+        self.backend = PDFBackend(thumb_cache=self.thumb_cache, render_service=self.render_service)
+        self.scheduler = RenderScheduler(self.backend, self._on_render_result, self._on_render_status, batch_size=Config.RENDER_BATCH)
         self.selected_indices = set()
-        self.card_widgets = []   
+        self.visible_cards = {}   # 页序号 -> PageCard (仅可视区 + 预留行)
+        self.card_pool = []       # 回收待复用的卡片
+        self.scroll_offset = 0
         self.clipboard_pages = []
-        self.image_cache = {} 
         
         self.setup_ui()
         self.create_context_menu()
@@ -294,22 +168,33 @@ class EditorFrame(ctk.CTkFrame):
         self.lbl_status = ctk.CTkLabel(self.toolbar, text="就绪", text_color="gray")
         self.lbl_status.pack(side="right", padx=20)
 
-        # Scroll Frame
-        self.scroll_frame = ctk.CTkScrollableFrame(self, fg_color=("white", "gray15"))
-        self.scroll_frame.pack(fill="both", expand=True, padx=10, pady=10)
+        # 虚拟网格：只为可视行 (+ 预留行) 创建卡片，滚动时复用
+        self.grid_area = ctk.CTkFrame(self, fg_color=("white", "gray15"))
+        self.grid_area.pack(fill="both", expand=True, padx=10, pady=10)
+        self.scrollbar = ctk.CTkScrollbar(self.grid_area, command=self.on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y", padx=(0, 2), pady=4)
+        self.viewport = ctk.CTkFrame(self.grid_area, fg_color="transparent", corner_radius=0)
+        self.viewport.pack(side="left", fill="both", expand=True, padx=4, pady=4)
         
-        # 绑定拖放到 scroll_frame
-        self.scroll_frame.drop_target_register(DND_FILES)
-        self.scroll_frame.dnd_bind('<<Drop>>', self.drop_file_handler)
+        # 绑定拖放到 viewport
+        self.viewport.drop_target_register(DND_FILES)
+        self.viewport.dnd_bind('<<Drop>>', self.drop_file_handler)
         
-        self.scroll_frame.bind("<Button-1>", lambda e: self.clear_selection())
+        self.viewport.bind("<Button-1>", lambda e: self.clear_selection())
+        self.viewport.bind("<Configure>", lambda e: self.update_viewport())
+        for seq in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.viewport.bind(seq, self.on_mouse_wheel)
         self.bind("<Control-a>", self.select_all)
         self.bind("<Control-z>", lambda e: self.do_undo())
         self.bind("<Control-y>", lambda e: self.do_redo())
         
-        self.lbl_hint = ctk.CTkLabel(self.scroll_frame, text="请拖入 PDF 文件或点击'打开'按钮", font=("", 20), text_color="gray")
+        self.lbl_hint = ctk.CTkLabel(self.viewport, text="请拖入 PDF 文件或点击'打开'按钮", font=("", 20), text_color="gray")
         self.lbl_hint.pack(pady=150)
 
+    def destroy(self):
+        self.render_service.shutdown()
+        super().destroy()
+
     def create_context_menu(self):
         self.context_menu = tk.Menu(self, tearoff=0)
         self.context_menu.add_command(label="✂️ 剪切选中", command=self.cut_selected)
@@ -338,114 +223,180 @@ class EditorFrame(ctk.CTkFrame):
         if self.lbl_hint.winfo_exists():
             self.lbl_hint.pack_forget()
             
-        for w in self.scroll_frame.winfo_children(): 
-            w.destroy()
-        self.card_widgets = []
+        self._recycle_cards(list(self.visible_cards))
+        self.scheduler.clear()
         self.selected_indices = set()
+        self.scroll_offset = 0
         
         try:
             self.backend.load(path)
-            self.image_cache = {} 
             self.lbl_status.configure(text=f"已加载: {os.path.basename(path)}")
             self.refresh_grid(initial=True)
         except Exception as e:
             messagebox.showerror("错误", f"无法加载PDF: {str(e)}")
             self.lbl_hint.pack(pady=150)
 
-    def refresh_grid(self, initial=False):
+    # --- 虚拟网格 ---
+
+    def _cell_size(self):
+        return Config.CARD_WIDTH + 2 * Config.CARD_PAD, Config.CARD_HEIGHT + 2 * Config.CARD_PAD
+
+    def _viewport_height(self):
+        # place() 的坐标会按 CTk 缩放系数放大，这里统一换算为未缩放单位
+        return self.viewport.winfo_height() / self.viewport._get_widget_scaling()
+
+    def _content_height(self):
+        rows = math.ceil(self.backend.get_page_count() / Config.GRID_COLS)
+        return rows * self._cell_size()[1]
+
+    def scroll_to(self, offset):
+        max_offset = max(0, self._content_height() - self._viewport_height())
+        self.scroll_offset = min(max(0, offset), max_offset)
+        self.update_viewport()
+
+    def on_scrollbar(self, *args):
+        if args[0] == "moveto":
+            self.scroll_to(float(args[1]) * self._content_height())
+        elif args[0] == "scroll":
+            step = self._viewport_height() if args[2] == "pages" else Config.SCROLL_STEP / 3
+            self.scroll_to(self.scroll_offset + float(args[1]) * step)
+
+    def on_mouse_wheel(self, event):
+        if event.num == 4: direction = -1
+        elif event.num == 5: direction = 1
+        else: direction = -1 if event.delta > 0 else 1
+        self.scroll_to(self.scroll_offset + direction * Config.SCROLL_STEP)
+        return "break"
+
+    def _recycle_cards(self, indices):
+        for idx in indices:
+            card = self.visible_cards.pop(idx)
+            card.place_forget()
+            self.card_pool.append(card)
+
+    def _bind_card(self, card, index, to_render):
+        """把 (可能是复用的) 卡片绑定到第 index 页"""
+        card.update_index(index)
+        card.set_selected(index in self.selected_indices)
+        orig_idx = self.backend.get_original_index(index)
+        cached = self.backend.cached_thumbnail(orig_idx)
+        if cached:
+            card.set_image(cached)
+        else:
+            # 同一页 (如撤销旋转) 先保留旧图，避免闪烁
+            if card.orig_idx != orig_idx or not card.has_full_image:
+                card.show_placeholder()
+            to_render.append(orig_idx)
+        card.orig_idx = orig_idx
+
+    def update_viewport(self, rebind=False):
         total_pages = self.backend.get_page_count()
-        current_count = len(self.card_widgets)
-        if total_pages == 0: return
-
-        if current_count < total_pages:
-            for i in range(current_count, total_pages):
-                card = PageCard(self.scroll_frame, i, self.backend, self.on_card_select, self.show_context_menu)
-                self.card_widgets.append(card)
-        elif current_count > total_pages:
-            for i in range(total_pages, current_count):
-                self.card_widgets[i].destroy()
-            self.card_widgets = self.card_widgets[:total_pages]
-
-        cols = 5
+        view_h = self._viewport_height()
+        cell_w, cell_h = self._cell_size()
+        cols = Config.GRID_COLS
+        
+        if total_pages == 0 or view_h <= 1:
+            self._recycle_cards(list(self.visible_cards))
+            self.scrollbar.set(0, 1)
+            return []
+
+        total_rows = math.ceil(total_pages / cols)
+        first_row = max(0, int(self.scroll_offset // cell_h) - Config.GRID_OVERSCAN_ROWS)
+        last_row = min(total_rows - 1, int((self.scroll_offset + view_h) // cell_h) + Config.GRID_OVERSCAN_ROWS)
+        wanted = range(first_row * cols, min(total_pages, (last_row + 1) * cols))
+
+        self._recycle_cards([idx for idx in self.visible_cards if idx not in wanted])
+
         to_render = []
+        for idx in wanted:
+            card = self.visible_cards.get(idx)
+            if card is None:
+                if self.card_pool:
+                    card = self.card_pool.pop()
+                else:
+                    card = PageCard(self.viewport, idx, self.backend, self.on_card_select, self.show_context_menu, self.on_mouse_wheel)
+                self.visible_cards[idx] = card
+                self._bind_card(card, idx, to_render)
+            elif rebind:
+                self._bind_card(card, idx, to_render)
+            row, col = divmod(idx, cols)
+            card.place(x=col * cell_w + Config.CARD_PAD, y=row * cell_h + Config.CARD_PAD - self.scroll_offset)
+
+        content_h = total_rows * cell_h
+        self.scrollbar.set(self.scroll_offset / content_h, min(1.0, (self.scroll_offset + view_h) / content_h))
+        self.scheduler.retain_visible(card.orig_idx for card in self.visible_cards.values())
+        self._request_renders(to_render)
+        return to_render
 
-        for i in range(total_pages):
-            card = self.card_widgets[i]
-            card.grid(row=i//cols, column=i%cols, padx=5, pady=5)
-            
-            card.update_index(i)
-            if i in self.selected_indices: 
-                card.set_selected(True)
-            else: 
-                card.set_selected(False)
-
-            orig_idx = self.backend.get_original_index(i)
-            if orig_idx in self.image_cache:
-                card.set_image(self.image_cache[orig_idx])
-            else:
-                card.lbl_img.configure(image=None, text="加载中...")
-                to_render.append((i, orig_idx))
-
-        if to_render:
+    def refresh_grid(self, initial=False):
+        # 页数变化后修正滚动位置，并把可见卡片重新绑定到 page_mapping
+        max_offset = max(0, self._content_height() - self._viewport_height())
+        self.scroll_offset = min(self.scroll_offset, max_offset)
+        to_render = self.update_viewport(rebind=True)
+        if not to_render and not initial:
+            self.lbl_status.configure(text="就绪")
+
+    def _request_renders(self, orig_indices, priority=RenderScheduler.VISIBLE):
+        queued = [o_idx for o_idx in orig_indices if self.scheduler.request(o_idx, priority)]
+        if queued:
             self.lbl_status.configure(text="正在加载图片...")
-            threading.Thread(target=self._async_render, args=(to_render,), daemon=True).start()
+
+    def _on_render_result(self, orig_idx, image, preview, target):
+        # 调度线程回调 -> 切回 UI 线程
+        self.after(0, lambda: self._apply_render(orig_idx, image, preview, target))
+
+    def _on_render_status(self, stats):
+        self.after(0, lambda: self._show_render_status(stats))
+
+    def _apply_render(self, orig_idx, image, preview, target):
+        # 渲染期间页面又被旋转、或已换了文件：丢弃过期结果 (新状态已显示缓存图或另有请求)
+        if not self.backend.is_current(orig_idx, target): return
+        for card in self.visible_cards.values():
+            if card.orig_idx == orig_idx:
+                card.set_image(image, preview=preview)
+
+    def _show_render_status(self, stats):
+        if stats['depth'] == 0:
+            self.lbl_status.configure(text="加载完成")
         else:
-            if not initial: 
-                self.lbl_status.configure(text="就绪")
-
-    def _async_render(self, tasks):
-        future_to_info = {}
-        with ThreadPoolExecutor(max_workers=8) as executor:
-            for c_idx, o_idx in tasks:
-                f = executor.submit(self.backend.render_thumbnail, o_idx)
-                future_to_info[f] = (c_idx, o_idx)
-            
-            for f in concurrent.futures.as_completed(future_to_info):
-                c_idx, o_idx = future_to_info[f]
-                try:
-                    img = f.result()
-                    if img:
-                        self.image_cache[o_idx] = img
-                        self.after(0, lambda c=c_idx, im=img: self._safe_update_card(c, im))
-                except: pass
-        self.after(0, lambda: self.lbl_status.configure(text="加载完成"))
-
-    def _safe_update_card(self, index, image):
-        if index < len(self.card_widgets):
-            self.card_widgets[index].set_image(image)
+            self.lbl_status.configure(text=f"正在加载图片... 剩余 {stats['depth']} 页 · 平均延迟 {stats['avg_latency_ms']:.0f} ms")
 
     # --- 交互操作 ---
 
     def on_card_select(self, index):
         if index in self.selected_indices:
             self.selected_indices.remove(index)
-            self.card_widgets[index].set_selected(False)
+            selected = False
         else:
             self.selected_indices.add(index)
-            self.card_widgets[index].set_selected(True)
+            selected = True
+        if index in self.visible_cards:
+            self.visible_cards[index].set_selected(selected)
         self.lbl_status.configure(text=f"选中 {len(self.selected_indices)} 页")
 
     def clear_selection(self):
         for idx in self.selected_indices:
-            if idx < len(self.card_widgets):
-                self.card_widgets[idx].set_selected(False)
+            if idx in self.visible_cards:
+                self.visible_cards[idx].set_selected(False)
         self.selected_indices.clear()
         self.lbl_status.configure(text="就绪")
 
     def select_all(self, event=None):
-        if not self.card_widgets: return
-        self.selected_indices = set(range(len(self.card_widgets)))
-        for card in self.card_widgets: 
+        total_pages = self.backend.get_page_count()
+        if not total_pages: return
+        self.selected_indices = set(range(total_pages))
+        for card in self.visible_cards.values(): 
             card.set_selected(True)
         self.lbl_status.configure(text=f"全选 {len(self.selected_indices)} 页")
 
     def select_landscape_pages(self):
         self.clear_selection()
         count = 0
-        for i, card in enumerate(self.card_widgets):
+        for i in range(self.backend.get_page_count()):
             if self.backend.is_landscape(i):
                 self.selected_indices.add(i)
-                card.set_selected(True)
+                if i in self.visible_cards:
+                    self.visible_cards[i].set_selected(True)
                 count += 1
         self.lbl_status.configure(text=f"自动选中 {count} 个横向页")
 
@@ -454,23 +405,24 @@ class EditorFrame(ctk.CTkFrame):
         
         for idx in self.selected_indices:
             self.backend.rotate_page(idx, angle)
-            orig_idx = self.backend.get_original_index(idx)
-            if orig_idx in self.image_cache: 
-                del self.image_cache[orig_idx]
 
-        self.lbl_status.configure(text="正在刷新旋转...")
+        # 已缓存的缩略图直接在内存中旋转；只有完全没有缓存的页才需要重新渲染
+        visible, acted = [], []
+        for idx in sorted(self.selected_indices):
+            orig_idx = self.backend.get_original_index(idx)
+            card = self.visible_cards.get(idx)
+            if card:
+                rotated = self.backend.cached_thumbnail(orig_idx)
+                if rotated: card.set_image(rotated)
+                else: visible.append(orig_idx)
+                card.refresh_text_ui()
+            elif not self.backend.has_cached_thumbnail(orig_idx):
+                acted.append(orig_idx)
+        self._request_renders(visible, RenderScheduler.VISIBLE)
+        self._request_renders(acted, RenderScheduler.ACTED)
         
-        def refresh_task():
-            for idx in list(self.selected_indices):
-                orig_idx = self.backend.get_original_index(idx)
-                new_img = self.backend.render_thumbnail(orig_idx) 
-                if new_img:
-                    self.image_cache[orig_idx] = new_img
-                    self.after(0, lambda i=idx, im=new_img: self._safe_update_card(i, im))
-            self.after(0, lambda: self.lbl_status.configure(text="旋转完成"))
-            self.after(0, self.update_undo_redo_buttons)
-
-        threading.Thread(target=refresh_task, daemon=True).start()
+        self.lbl_status.configure(text="正在刷新旋转...")
+        self.update_undo_redo_buttons()
 
     def delete_selected(self):
         if not self.selected_indices: return
@@ -508,41 +460,15 @@ class EditorFrame(ctk.CTkFrame):
     def do_undo(self):
         if self.backend.undo():
             self.clear_selection()
-            self.refresh_grid()  # Refresh card layout and indices
-            self.lbl_status.configure(text="正在刷新...")
-            
-            # Async re-render all thumbnails
-            def refresh_task():
-                total = self.backend.get_page_count()
-                for idx in range(total):
-                    orig_idx = self.backend.get_original_index(idx)
-                    new_img = self.backend.render_thumbnail(orig_idx)
-                    if new_img:
-                        self.image_cache[orig_idx] = new_img
-                        self.after(0, lambda i=idx, im=new_img: self._safe_update_card(i, im))
-                self.after(0, lambda: self.lbl_status.configure(text="撤销完成"))
-            
-            threading.Thread(target=refresh_task, daemon=True).start()
+            self.refresh_grid()  # 重新绑定可见卡片，旋转变化的页由调度器重新渲染
+            self.lbl_status.configure(text="撤销完成")
         self.update_undo_redo_buttons()
 
     def do_redo(self):
         if self.backend.redo():
             self.clear_selection()
-            self.refresh_grid()  # Refresh card layout and indices
-            self.lbl_status.configure(text="正在刷新...")
-            
-            # Async re-render all thumbnails
-            def refresh_task():
-                total = self.backend.get_page_count()
-                for idx in range(total):
-                    orig_idx = self.backend.get_original_index(idx)
-                    new_img = self.backend.render_thumbnail(orig_idx)
-                    if new_img:
-                        self.image_cache[orig_idx] = new_img
-                        self.after(0, lambda i=idx, im=new_img: self._safe_update_card(i, im))
-                self.after(0, lambda: self.lbl_status.configure(text="重做完成"))
-            
-            threading.Thread(target=refresh_task, daemon=True).start()
+            self.refresh_grid()
+            self.lbl_status.configure(text="重做完成")
         self.update_undo_redo_buttons()
 
     def update_undo_redo_buttons(self):
@@ -556,8 +482,8 @@ class EditorFrame(ctk.CTkFrame):
         path = filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF", "*.pdf")])
         if path:
             try:
-                self.backend.save(path)
-                messagebox.showinfo("成功", "保存成功")
+                mode = self.backend.save(path)
+                messagebox.showinfo("成功", "保存成功 (仅追加旋转变更)" if mode == "incremental" else "保存成功")
             except Exception as e:
                 messagebox.showerror("错误", str(e))
 
@@ -1,134 +1,21 @@
 import os
-import time
-import math
-import io
 import threading
 import multiprocessing
-import tempfile
-import shutil
-from concurrent.futures import ProcessPoolExecutor
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
 from tkinterdnd2 import DND_FILES, TkinterDnD
-from PIL import Image
-import fitz  # PyMuPDF
 from natsort import natsorted
-from config import Img2PdfConfig as Config
 from settings_manager import SettingsManager
-from pillow_heif import register_heif_opener
-
-register_heif_opener()
 
 # ==============================================================================
 # 配置
 # ==============================================================================
 from config import Img2PdfConfig as Config
-from utils import save_pdf_optimized
 
 # ==============================================================================
-# 核心逻辑：通用排版工作单元 (含压缩与自适应)
+# 核心逻辑 (见 iroha.img2pdf)
 # ==============================================================================
-class PuzzleWorker:
-    @staticmethod
-    def render_chunk(args):
-        image_paths, options, temp_filename = args
-        try:
-            doc = fitz.open()
-            
-            # 解析基础参数
-            rows = options.get('rows', 1)
-            cols = options.get('cols', 1)
-            items_per_page = rows * cols
-            
-            # 压缩参数
-            max_dim = options.get('max_dim', 2000)
-            quality = options.get('quality', 75)
-            
-            # 模式判断
-            is_standard_mode = (rows == 1 and cols == 1)
-            
-            total_chunk_imgs = len(image_paths)
-            
-            for i in range(0, total_chunk_imgs, items_per_page):
-                # 获取本页图片
-                batch = image_paths[i : i + items_per_page]
-                if not batch: break
-
-                # --- 页面尺寸决策 ---
-                # 默认根据 options 里的 orientation 设置
-                if options['orientation'] == 'l': 
-                    pw, ph = Config.A4_H, Config.A4_W
-                else: 
-                    pw, ph = Config.A4_W, Config.A4_H
-
-                # 【智能优化】标准模式下，根据第一张图自动旋转纸张
-                if is_standard_mode and len(batch) == 1:
-                    try:
-                        with Image.open(batch[0]) as tmp_img:
-                            # 如果图片宽>高，且当前纸张是竖向，则转为横向
-                            if tmp_img.width > tmp_img.height and pw < ph:
-                                pw, ph = ph, pw
-                            # 如果图片高>宽，且当前纸张是横向，则转为竖向
-                            elif tmp_img.height > tmp_img.width and pw > ph:
-                                pw, ph = ph, pw
-                    except: pass
-
-                # 创建页面
-                page = doc.new_page(width=pw, height=ph)
-                
-                # 计算格子参数
-                valid_w = pw - 2*Config.MARGIN
-                valid_h = ph - 2*Config.MARGIN
-                cell_w = (valid_w - (cols - 1) * Config.GAP) / cols
-                cell_h = (valid_h - (rows - 1) * Config.GAP) / rows
-
-                for j, img_path in enumerate(batch):
-                    try:
-                        r, c = j // cols, j % cols
-                        x0 = Config.MARGIN + c * (cell_w + Config.GAP)
-                        y0 = Config.MARGIN + r * (cell_h + Config.GAP)
-                        
-                        img_area_h = cell_h
-                        if options['label_mode'] != 'none': img_area_h -= Config.TEXT_H
-                        
-                        rect = fitz.Rect(x0, y0, x0 + cell_w, y0 + img_area_h)
-                        
-                        # --- 图片处理与压缩 ---
-                        pil_img = Image.open(img_path)
-                        from PIL import ImageOps
-                        pil_img = ImageOps.exif_transpose(pil_img)
-                        
-                        # 核心压缩逻辑：缩放
-                        w, h = pil_img.size
-                        if w > max_dim or h > max_dim:
-                            pil_img.thumbnail((max_dim, max_dim), Image.Resampling.LANCZOS)
-                        
-                        # 转字节流 (JPEG压缩)
-                        img_byte_arr = io.BytesIO()
-                        pil_img.save(img_byte_arr, format='JPEG', quality=quality)
-                        
-                        # 插入 PDF (居中, 保持比例)
-                        page.insert_image(rect, stream=img_byte_arr.getvalue(), keep_proportion=True)
-                        
-                        # --- 标签 ---
-                        if options['label_mode'] != 'none':
-                            global_idx = options.get('start_index', 0) + i + j + 1
-                            lbl = os.path.basename(img_path) if options['label_mode'] == 'filename' else f"图 {global_idx}"
-                            
-                            # 文字区域
-                            text_rect = fitz.Rect(x0, y0 + img_area_h, x0 + cell_w, y0 + cell_h)
-                            
-                            # 使用 insert_textbox 自动居中
-                            page.insert_textbox(text_rect, lbl, fontname="china-ss", fontsize=10, align=1)
-                            
-                    except Exception as e:
-                        print(f"Skip {img_path}: {e}")
-            
-            save_pdf_optimized(doc, temp_filename)
-            doc.close()
-            return temp_filename
-        except Exception as e:
-            return None
+from iroha.img2pdf import scan_images, plan_compression, images_to_pdf, EncoderPool
 
 # ==============================================================================
 # UI 组件：拖拽条目
@@ -201,11 +88,16 @@ class Img2PdfFrame(ctk.CTkFrame, TkinterDnD.DnDWrapper):
         self.target_item = None
         self.pending_files = [] 
         self.load_more_btn = None 
+        self.pool = EncoderPool(Config.WORKERS)
         
         self.setup_ui()
         self.drop_target_register(DND_FILES)
         self.dnd_bind('<<Drop>>', self.drop_handler)
 
+    def destroy(self):
+        self.pool.shutdown()
+        super().destroy()
+
     def setup_ui(self):
         self.lbl_title = ctk.CTkLabel(self, text="图片合成 PDF 工具", font=("Microsoft YaHei UI", 24, "bold"))
         self.lbl_title.pack(pady=(20, 5))
@@ -320,16 +212,7 @@ class Img2PdfFrame(ctk.CTkFrame, TkinterDnD.DnDWrapper):
         threading.Thread(target=self._scan_files_bg, args=(paths,), daemon=True).start()
 
     def _scan_files_bg(self, paths):
-        valid_ext = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.heic', '.webp')
-        new_paths = []
-        for p in paths:
-            if os.path.isfile(p) and p.lower().endswith(valid_ext): new_paths.append(p)
-            elif os.path.isdir(p):
-                for root, _, files in os.walk(p):
-                    for f in files:
-                        if f.lower().endswith(valid_ext): new_paths.append(os.path.join(root, f))
-        
-        sorted_new = natsorted(list(set(new_paths)))
+        sorted_new = scan_images(paths)
         self.after(0, lambda: self._process_new_files(sorted_new))
 
     def _process_new_files(self, new_paths):
@@ -337,6 +220,7 @@ class Img2PdfFrame(ctk.CTkFrame, TkinterDnD.DnDWrapper):
             self.lbl_loading.configure(text="")
             return
         if self.lbl_empty: self.lbl_empty.destroy(); self.lbl_empty = None
+        self.pool.warm()  # 用户挑图的同时在后台拉起编码进程
         
         to_show = []
         to_hide = []
@@ -454,16 +338,7 @@ class Img2PdfFrame(ctk.CTkFrame, TkinterDnD.DnDWrapper):
         except: opts['target_mb'] = 50.0
         
         # --- 统一计算压缩参数 ---
-        # 无论是拼图还是标准模式，都先算出 "每张图能分到多少KB"
-        total_kb = opts['target_mb'] * 1024 * 0.90 # 预留10%
-        avg_kb = total_kb / max(1, len(final_image_paths))
-        
-        # 分级压缩策略 (Granular Compression Scale)
-        if avg_kb < 50: opts['max_dim'] = 800; opts['quality'] = 40
-        elif avg_kb < 100: opts['max_dim'] = 1000; opts['quality'] = 50
-        elif avg_kb < 200: opts['max_dim'] = 1500; opts['quality'] = 65
-        elif avg_kb < 500: opts['max_dim'] = 2000; opts['quality'] = 75
-        else: opts['max_dim'] = 2500; opts['quality'] = 85
+        opts['max_dim'], opts['quality'] = plan_compression(opts['target_mb'], len(final_image_paths))
         
         if mode == "puzzle":
             try:
@@ -488,59 +363,19 @@ class Img2PdfFrame(ctk.CTkFrame, TkinterDnD.DnDWrapper):
         threading.Thread(target=self.run_process_multicore, args=(final_image_paths, opts, save_path), daemon=True).start()
 
     def run_process_multicore(self, image_paths, opts, save_path):
-        import time
-        t_start = time.time()
         try:
-            cpu_count = multiprocessing.cpu_count()
-            total_files = len(image_paths)
-            if total_files < 10: cpu_count = 1
-            
-            # 计算切分 (拼图模式必须按页对齐)
-            items_per_page = opts['rows'] * opts['cols']
-            pages_per_core = math.ceil((total_files / items_per_page) / cpu_count)
-            chunk_size = pages_per_core * items_per_page
-                
-            temp_dir = tempfile.mkdtemp()
-            tasks = []
-            
-            for i in range(0, total_files, chunk_size):
-                chunk = image_paths[i : i + chunk_size]
-                temp_file = os.path.join(temp_dir, f"part_{len(tasks)}.pdf")
-                chunk_opts = opts.copy()
-                chunk_opts['start_index'] = i
-                tasks.append((chunk, chunk_opts, temp_file))
-
-            processed_pdfs = []
-            with ProcessPoolExecutor(max_workers=cpu_count) as executor:
-                futures = [executor.submit(PuzzleWorker.render_chunk, t) for t in tasks]
-                import concurrent.futures
-                completed_count = 0
-                for f in concurrent.futures.as_completed(futures):
-                    res = f.result()
-                    if res: processed_pdfs.append(res)
-                    completed_count += 1
-                    prog = completed_count / len(tasks)
-                    self.after(0, lambda v=prog: [self.progress.set(v), self.lbl_status.configure(text=f"生成中: {int(v*100)}%")])
-
-            self.lbl_status.configure(text="正在合并...")
-            final_doc = fitz.open()
-            # 按文件名排序 temp files
-            processed_pdfs.sort(key=lambda x: int(os.path.basename(x).split('_')[1].split('.')[0]))
-            
-            for pdf_path in processed_pdfs:
-                with fitz.open(pdf_path) as sub: final_doc.insert_pdf(sub)
+            def on_progress(v):
+                self.after(0, lambda: [self.progress.set(v), self.lbl_status.configure(text=f"生成中: {int(v*100)}%")])
             
-            save_pdf_optimized(final_doc, save_path)
-            final_doc.close()
-            shutil.rmtree(temp_dir)
+            duration = images_to_pdf(image_paths, opts, save_path, progress=on_progress, pool=self.pool)
             
             size = os.path.getsize(save_path) / (1024*1024)
-            duration = time.time() - t_start
             self.after(0, lambda: messagebox.showinfo("成功", f"文件已生成！\n大小: {size:.2f} MB\n耗时: {duration:.2f}s"))
             
         except Exception as e:
             print(e)
-            self.after(0, lambda: messagebox.showerror("错误", str(e)))
+            err = str(e)
+            self.after(0, lambda: messagebox.showerror("错误", err))
         finally:
             self.after(0, lambda: [self.btn_run.configure(state="normal", text="开始导出 PDF"), self.lbl_status.configure(text="就绪")])
 
@@ -1,6 +1,5 @@
 import os
-import fitz  # PyMuPDF
-from utils import save_pdf_optimized
+import threading
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
 from tkinterdnd2 import DND_FILES, TkinterDnD
@@ -12,65 +11,10 @@ from settings_manager import SettingsManager
 from config import MergerConfig as Config
 
 # ==============================================================================
-# 后端逻辑
+# 后端逻辑 (见 iroha.merger)
 # ==============================================================================
-class MergerBackend:
-    def __init__(self):
-        self.file_list = []
-
-    def add_files(self, paths):
-        count = 0
-        existing_paths = {item['path'] for item in self.file_list}
-        
-        for path in paths:
-            if not path.lower().endswith('.pdf'): continue
-            if path in existing_paths: continue 
-            
-            try:
-                with fitz.open(path) as doc:
-                    pages = doc.page_count
-                    
-                self.file_list.append({
-                    'path': path,
-                    'name': os.path.basename(path),
-                    'pages': pages
-                })
-                count += 1
-            except:
-                print(f"无法读取: {path}")
-        return count
-
-    def move_item(self, from_index, to_index):
-        if from_index == to_index: return False
-        if not (0 <= from_index < len(self.file_list) and 0 <= to_index < len(self.file_list)):
-            return False
-            
-        item = self.file_list.pop(from_index)
-        self.file_list.insert(to_index, item)
-        return True
-
-    def remove_item(self, index):
-        if 0 <= index < len(self.file_list):
-            self.file_list.pop(index)
-
-    def clear_all(self):
-        self.file_list = []
-
-
-    def merge(self, save_path):
-        if not self.file_list: return
-        merged_doc = fitz.open()
-        try:
-            for item in self.file_list:
-                with fitz.open(item['path']) as src_doc:
-                    merged_doc.insert_pdf(src_doc)
-            
-            success = save_pdf_optimized(merged_doc, save_path)
-            merged_doc.close()
-            return success
-        except Exception as e:
-            print(f"Merge Error: {e}")
-            return False
+from iroha.merger import MergerBackend
+from iroha.probe import ProbeService
 
 # ==============================================================================
 # UI 组件：可拖拽的文件条目 (修复了事件捕获问题)
@@ -81,6 +25,7 @@ class FileItem(ctk.CTkFrame):
         
         self.current_index = index 
         self.callbacks = callbacks 
+        self.file_info = file_info
         
         self.grid_propagate(False) 
 
@@ -100,17 +45,47 @@ class FileItem(ctk.CTkFrame):
 
         # 3. 文件名
         self.lbl_name = ctk.CTkLabel(self, text=file_info['name'], anchor="w", font=("Microsoft YaHei UI", 13))
-        self.lbl_name.place(x=80, rely=0, relheight=1, relwidth=0.6)
+        self.lbl_name.place(x=80, rely=0, relheight=1, relwidth=0.38)
 
-        # 4. 页数
-        self.lbl_pages = ctk.CTkLabel(self, text=f"{file_info['pages']} 页", width=60, text_color="gray")
+        # 4. 页范围 / 旋转 (合并时直接生效，无需先另存)
+        self.entry_range = ctk.CTkEntry(self, width=110, height=26, placeholder_text="页范围 如 3-10")
+        self.entry_range.place(relx=0.5, rely=0.17)
+        if file_info.get('range'): self.entry_range.insert(0, file_info['range'])
+        self.entry_range.bind("<Return>", self.on_range_commit)
+        self.entry_range.bind("<FocusOut>", self.on_range_commit)
+
+        self.btn_rotate = ctk.CTkButton(self, text="", width=50, height=24, fg_color="transparent", border_width=1,
+                                        text_color=("gray10", "gray90"), command=self.on_rotate)
+        self.btn_rotate.place(relx=0.65, rely=0.2)
+
+        # 5. 页数
+        self.lbl_pages = ctk.CTkLabel(self, text="", width=60, text_color="gray")
         self.lbl_pages.place(relx=0.75, rely=0.25)
+        self.update_info()
 
-        # 5. 删除按钮
+        # 6. 删除按钮
         self.btn_del = ctk.CTkButton(self, text="✕", width=30, height=24, fg_color="#dc3545", 
                                      command=lambda: callbacks['remove'](self))
         self.btn_del.place(relx=0.92, rely=0.2)
 
+    def update_info(self):
+        info = self.file_info
+        if info['pages'] is None: text = "读取中..."
+        elif info.get('encrypted'): text = "🔒 加密"
+        elif info.get('range'): text = f"{MergerBackend.selected_pages(info)}/{info['pages']} 页"
+        else: text = f"{info['pages']} 页"
+        self.lbl_pages.configure(text=text)
+        self.btn_rotate.configure(text=f"↻{info.get('rotate', 0)}°")
+
+    def on_range_commit(self, event=None):
+        spec = self.entry_range.get()
+        if spec.strip() == self.file_info.get('range', ''): return
+        ok = self.callbacks['options'](self, page_range=spec)
+        self.entry_range.configure(border_color="#dc3545" if not ok else ("#979DA2", "#565B5E"))
+
+    def on_rotate(self):
+        self.callbacks['options'](self, rotate=self.file_info.get('rotate', 0) + 90)
+
     def update_index_display(self, new_index):
         self.current_index = new_index
         self.lbl_idx.configure(text=f"{new_index+1}.")
@@ -168,7 +143,8 @@ class MergerFrame(ctk.CTkFrame, TkinterDnD.DnDWrapper):
         super().__init__(master)
         self.TkdndVersion = TkinterDnD._require(self)
         
-        self.backend = MergerBackend()
+        self.probe_service = ProbeService(Config.PROBE_WORKERS)
+        self.backend = MergerBackend(probe_service=self.probe_service)
         self.item_widgets = [] 
         
         self.dragging_item = None 
@@ -179,6 +155,10 @@ class MergerFrame(ctk.CTkFrame, TkinterDnD.DnDWrapper):
         self.drop_target_register(DND_FILES)
         self.dnd_bind('<<Drop>>', self.drop_handler)
 
+    def destroy(self):
+        self.probe_service.shutdown()
+        super().destroy()
+
     def setup_ui(self):
         # self.title(Config.APP_NAME)
         # self.geometry(Config.APP_SIZE)
@@ -279,20 +259,21 @@ class MergerFrame(ctk.CTkFrame, TkinterDnD.DnDWrapper):
             self.add_files(paths)
 
     def add_files(self, paths):
-        added_count = self.backend.add_files(paths)
-        if added_count == 0: return
+        # 先按顺序放入占位条目，页数等信息由后台探测陆续填入，不阻塞界面
+        new_items = self.backend.add_pending(paths)
+        if not new_items: return
 
         if self.lbl_empty: self.lbl_empty.destroy()
         self.lbl_empty = None
 
         start_index = len(self.item_widgets)
-        new_items = self.backend.file_list[-added_count:]
         
         callbacks = {
             'remove': self.remove_item_widget,
             'drag_start': self.on_item_drag_start,
             'drag_end': self.on_item_drag_end,
-            'drag_enter': self.on_item_drag_enter # 传递这个回调
+            'drag_enter': self.on_item_drag_enter, # 传递这个回调
+            'options': self.on_item_options
         }
 
         for i, info in enumerate(new_items):
@@ -302,11 +283,34 @@ class MergerFrame(ctk.CTkFrame, TkinterDnD.DnDWrapper):
             self.item_widgets.append(item)
 
         self.update_status()
+        threading.Thread(target=self._probe_worker, args=(new_items,), daemon=True).start()
+
+    def _probe_worker(self, items):
+        for item, info in self.backend.probe_items(items):
+            self.after(0, self._on_probed, item, info)
+
+    def _on_probed(self, item, info):
+        widget = next((w for w in self.item_widgets if w.file_info is item), None)
+        if widget is None: return  # 探测期间已被移除/清空
+        if self.backend.apply_probe(item, info):
+            widget.update_info()
+        else:
+            self.remove_item_widget(widget, backend_removed=True)
+        self.update_status()
+
+    def on_item_options(self, widget, page_range=None, rotate=None):
+        try:
+            self.backend.set_item_options(self.item_widgets.index(widget), page_range=page_range, rotate=rotate)
+        except ValueError:
+            return False
+        widget.update_info()
+        self.update_status()
+        return True
 
-    def remove_item_widget(self, widget):
+    def remove_item_widget(self, widget, backend_removed=False):
         try:
             idx = self.item_widgets.index(widget)
-            self.backend.remove_item(idx)
+            if not backend_removed: self.backend.remove_item(idx)
             widget.destroy()
             self.item_widgets.pop(idx)
             
@@ -327,9 +331,12 @@ class MergerFrame(ctk.CTkFrame, TkinterDnD.DnDWrapper):
 
     def update_status(self):
         count = len(self.backend.file_list)
-        pages = sum(x['pages'] for x in self.backend.file_list)
-        self.lbl_status.configure(text=f"共 {count} 个文件 (合计 {pages} 页)")
-        self.btn_merge.configure(state="normal" if count > 0 else "disabled")
+        pages = sum(MergerBackend.selected_pages(x) for x in self.backend.file_list)
+        probing = self.backend.is_probing()
+        text = f"共 {count} 个文件 (合计 {pages} 页)"
+        if probing: text += "  正在读取..."
+        self.lbl_status.configure(text=text)
+        self.btn_merge.configure(state="normal" if count > 0 and not probing else "disabled")
 
     def merge_files(self):
         initial_dir = SettingsManager().get("last_file_directory")
@@ -340,15 +347,26 @@ class MergerFrame(ctk.CTkFrame, TkinterDnD.DnDWrapper):
         self.btn_merge.configure(state="disabled", text="正在合并...")
         self.update()
 
-        success = self.backend.merge(save_path)
+        total_mb = sum(x.get('size') or 0 for x in self.backend.file_list) / (1024*1024)
+        stats = None
+        if total_mb > Config.STREAMING_THRESHOLD_MB:
+            stats = self.backend.merge_streaming(save_path, max_memory_mb=Config.MAX_MEMORY_MB)
+            success = stats is not None
+        elif len(self.backend.file_list) > Config.PARALLEL_THRESHOLD_FILES:
+            stats = self.backend.merge_parallel(save_path, max_workers=Config.MERGE_WORKERS, group_size=Config.MERGE_GROUP_SIZE)
+            success = stats is not None
+        else:
+            success = self.backend.merge(save_path)
         
         self.btn_merge.configure(state="normal", text="开始合并")
         
         if success:
             size = os.path.getsize(save_path) / (1024*1024)
-            messagebox.showinfo("成功", f"合并成功！\n体积: {size:.2f} MB")
+            msg = f"合并成功！\n体积: {size:.2f} MB"
+            if stats and stats.get('peak_mb') is not None: msg += f"\n内存增量峰值: {stats['peak_mb']:.0f} MB"
+            messagebox.showinfo("成功", msg)
         else:
-            messagebox.showerror("错误", "合并失败，请检查文件是否被占用")
+            messagebox.showerror("错误", f"合并失败: {self.backend.last_error}" if self.backend.last_error else "合并失败，请检查文件是否被占用")
 
 if __name__ == "__main__":
     from tkinterdnd2 import TkinterDnD
@@ -11,7 +11,7 @@ import threading
 # 配置
 # ==============================================================================
 from config import PaginatorConfig as Config, GlobalConfig
-from utils import save_pdf_optimized
+from iroha.paginator import paginate, paginate_sharded, paginate_batch, format_label, number_label
 
 # ==============================================================================
 # UI 组件：九宫格
@@ -122,6 +122,8 @@ class PaginatorFrame(ctk.CTkFrame, TkinterDnD.DnDWrapper):
         f_style.pack(fill="x", padx=15)
         self.combo_tpl = ctk.CTkComboBox(f_style, values=["{n}", "- {n} -", "{n} / {t}", "第 {n} 页"], width=150, command=self.update_preview)
         self.combo_tpl.grid(row=0, column=0, columnspan=2, pady=5, sticky="w"); self.combo_tpl.set("- {n} -")
+        ctk.CTkLabel(f_style, text="前缀:").grid(row=0, column=2, padx=(10, 5))
+        self.entry_prefix = ctk.CTkEntry(f_style, width=70, placeholder_text="ACME-"); self.entry_prefix.grid(row=0, column=3)
         ctk.CTkLabel(f_style, text="字号:").grid(row=1, column=0, sticky="w")
         self.slider_font = ctk.CTkSlider(f_style, from_=6, to=100, number_of_steps=94, command=self.update_preview)
         self.slider_font.grid(row=1, column=1, sticky="ew"); self.slider_font.set(12)
@@ -131,6 +133,8 @@ class PaginatorFrame(ctk.CTkFrame, TkinterDnD.DnDWrapper):
         self.btn_color = ctk.CTkButton(f_color, text="A  字体颜色", width=100, fg_color="black", command=self.pick_color)
         self.btn_color.pack(side="left", padx=5)
         self.chk_bg_box = ctk.CTkCheckBox(f_color, text="加白底 (防深色背景)", command=self.update_preview); self.chk_bg_box.pack(side="left", padx=15)
+        self.chk_fast = ctk.CTkCheckBox(self.frame_left, text="快速盖章 (不重写原页面内容，仅在需要时包裹)")
+        self.chk_fast.pack(anchor="w", padx=20, pady=(0, 5))
 
         # === 右侧 ===
         self.frame_right = ctk.CTkFrame(container)
@@ -155,12 +159,14 @@ class PaginatorFrame(ctk.CTkFrame, TkinterDnD.DnDWrapper):
         self.progress = ctk.CTkProgressBar(self.frame_bot); self.progress.pack(fill="x", pady=(0,10)); self.progress.set(0)
         self.btn_run = ctk.CTkButton(self.frame_bot, text="开始处理 (强力坐标修正)", command=self.start_processing, height=50, font=("", 18, "bold"), state="disabled")
         self.btn_run.pack(fill="x")
+        self.btn_batch = ctk.CTkButton(self.frame_bot, text="批量连续编号 (多个文件)...", command=self.start_batch, height=32, fg_color="gray40")
+        self.btn_batch.pack(fill="x", pady=(8, 0))
 
         self.bind_events()
         self.toggle_total_entry()
 
     def bind_events(self):
-        for w in [self.entry_start, self.entry_end, self.entry_logic_start, self.entry_total, self.entry_off_x, self.entry_off_y]:
+        for w in [self.entry_start, self.entry_end, self.entry_logic_start, self.entry_total, self.entry_off_x, self.entry_off_y, self.entry_prefix]:
             w.bind("<KeyRelease>", self.update_preview)
 
     def pick_color(self):
@@ -218,13 +224,11 @@ class PaginatorFrame(ctk.CTkFrame, TkinterDnD.DnDWrapper):
             y_off = int(self.entry_off_y.get())
             font_size = int(self.slider_font.get())
             tpl = self.combo_tpl.get()
-            logic_s = self.entry_logic_start.get()
-            total_v = self.entry_total.get()
+            text_str = format_label(tpl, int(self.entry_logic_start.get()), self.entry_total.get(), self.entry_prefix.get())
         except: return
 
         W, H = 160, 240
         sx, sy = 20, 20
-        text_str = tpl.replace("{n}", logic_s).replace("{t}", total_v)
         est_w = len(text_str) * (font_size * 0.6)
         est_h = font_size
         
@@ -247,20 +251,27 @@ class PaginatorFrame(ctk.CTkFrame, TkinterDnD.DnDWrapper):
         self.canvas.coords(self.preview_text, cx, cy)
         self.canvas.itemconfig(self.preview_text, text=text_str, font=("Arial", int(font_size/1.5)), fill=self.text_color_hex, anchor=anchor)
 
+    def style_options(self):
+        return {
+            'logic_s': int(self.entry_logic_start.get()),
+            'tpl': self.combo_tpl.get(),
+            'prefix': self.entry_prefix.get(),
+            'size': int(self.slider_font.get()),
+            'pos': self.pos_selector.current_pos,
+            'mx': float(self.entry_off_x.get()),
+            'my': float(self.entry_off_y.get()),
+            'rgb': self.text_color_rgb,
+            'bg_box': self.chk_bg_box.get(),
+            'clean': "fast" if self.chk_fast.get() else "auto"
+        }
+
     def start_processing(self):
         try:
             cfg = {
+                **self.style_options(),
                 'start_p': int(self.entry_start.get()),
                 'end_p': int(self.entry_end.get()),
-                'logic_s': int(self.entry_logic_start.get()),
                 'total': int(self.entry_total.get()),
-                'tpl': self.combo_tpl.get(),
-                'size': int(self.slider_font.get()),
-                'pos': self.pos_selector.current_pos,
-                'mx': float(self.entry_off_x.get()),
-                'my': float(self.entry_off_y.get()),
-                'rgb': self.text_color_rgb,
-                'bg_box': self.chk_bg_box.get()
             }
         except: messagebox.showerror("错误", "参数有误"); return
 
@@ -274,94 +285,56 @@ class PaginatorFrame(ctk.CTkFrame, TkinterDnD.DnDWrapper):
         threading.Thread(target=self.run_worker, args=(cfg, save_path), daemon=True).start()
 
     def run_worker(self, cfg, save_path):
-        """
-        【算法核心升级】
-        使用 Visual Rect + Derotation Matrix 解决扫描件坐标错位问题
-        """
         try:
-            doc = fitz.open(self.file_path)
-            
-            p_start = cfg['start_p'] - 1
-            p_end = cfg['end_p'] - 1
-            target_pages = range(p_start, min(p_end + 1, len(doc)))
-            total_task = len(target_pages)
-
-            if total_task == 0: raise ValueError("范围无效")
-
-            for i, idx in enumerate(target_pages):
-                page = doc[idx]
-                
-                # 1. 修复图层
-                try: page.clean_contents()
-                except: pass
-
-                # 2. 文本内容
-                log_num = (idx - p_start) + cfg['logic_s']
-                text = cfg['tpl'].replace("{n}", str(log_num)).replace("{t}", str(cfg['total']))
-                
-                # 3. 坐标计算（核心！）
-                # 获取可见区域 rect (这已经是旋转后的、人眼看到的矩形)
-                rect = page.rect
-                
-                # 获取文本宽度（用于对齐）
-                text_len = fitz.get_text_length(text, fontname="helv", fontsize=cfg['size'])
-                
-                # 在【可视坐标系】中计算目标点 (vx, vy)
-                vx, vy = 0, 0
-                
-                # Y轴 (基线)
-                # 注意：insert_text 的锚点是基线左侧
-                if "top" in cfg['pos']: vy = rect.y0 + cfg['my'] + cfg['size']
-                elif "bottom" in cfg['pos']: vy = rect.y1 - cfg['my']
-                else: vy = rect.height/2 + cfg['my'] + cfg['size']/2
-                
-                # X轴
-                if "left" in cfg['pos']: vx = rect.x0 + cfg['mx']
-                elif "right" in cfg['pos']: vx = rect.x1 - cfg['mx'] - text_len
-                else: vx = rect.x0 + (rect.width/2) + cfg['mx'] - text_len/2
-
-                # 4. 坐标逆向映射 (Visual -> Physical)
-                # 将我们在可视区域算好的点，转换回 PDF 物理坐标
-                vis_point = fitz.Point(vx, vy)
-                # 使用 derotation_matrix 将可视点映射回物理点
-                phys_point = vis_point * page.derotation_matrix
-                
-                # 5. 写入
-                # rotate=page.rotation 确保文字跟着页面的旋转方向走，保持“正立”
-                
-                # 绘制背景块
-                if cfg['bg_box']:
-                    # 构造一个可视区域的矩形
-                    vis_rect = fitz.Rect(vx - 4, vy - cfg['size'] - 2, vx + text_len + 4, vy + 4)
-                    # 映射回物理矩形
-                    phys_rect = vis_rect * page.derotation_matrix
-                    page.draw_rect(phys_rect, color=(1,1,1), fill=(1,1,1), overlay=True)
-
-                page.insert_text(
-                    phys_point, # 使用物理坐标
-                    text,
-                    fontsize=cfg['size'],
-                    fontname="helv",
-                    color=[c/255 for c in cfg['rgb']],
-                    rotate=page.rotation, # 【关键】跟随页面旋转
-                    overlay=True
-                )
-                
-                if i % 10 == 0 or i == total_task - 1:
-                    self.after(0, lambda v=(i+1)/total_task: self.progress.set(v))
-
-            save_pdf_optimized(doc, save_path)
-            doc.close()
-            self.after(0, lambda: self.finish(True))
+            progress = lambda v: self.after(0, lambda: self.progress.set(v))
+            if self.file_page_count >= Config.SHARD_MIN_PAGES:
+                stats = paginate_sharded(self.file_path, save_path, cfg, max_workers=Config.WORKERS, progress=progress)
+            else:
+                stats = paginate(self.file_path, save_path, cfg, progress=progress)
+            msg = f"原样 {stats['untouched']} 页, 包裹 {stats['wrapped']} 页, 清理 {stats['cleaned']} 页"
+            self.after(0, lambda: self.finish(True, msg))
             
         except Exception as e:
             print(e)
-            self.after(0, lambda: self.finish(False, str(e)))
+            err = str(e)
+            self.after(0, lambda: self.finish(False, err))
+
+    def start_batch(self):
+        try:
+            cfg = self.style_options()
+            # 总页数自动时由批处理统计全部文件的页数
+            if not self.chk_auto_total.get(): cfg['total'] = int(self.entry_total.get())
+        except: messagebox.showerror("错误", "参数有误"); return
+
+        initial_dir = SettingsManager().get("last_file_directory")
+        paths = filedialog.askopenfilenames(filetypes=[("PDF", "*.pdf")], initialdir=initial_dir)
+        if not paths: return
+        SettingsManager().update_last_dir(paths[0])
+
+        self.btn_run.configure(state="disabled")
+        self.btn_batch.configure(state="disabled", text="正在批量处理...")
+        self.progress.set(0)
+        threading.Thread(target=self.run_batch_worker, args=(list(paths), cfg), daemon=True).start()
+
+    def run_batch_worker(self, paths, cfg):
+        try:
+            progress = lambda v: self.after(0, lambda: self.progress.set(v))
+            results = paginate_batch(paths, cfg, max_workers=Config.WORKERS, progress=progress)
+            label = lambda n: number_label(cfg['tpl'], n, cfg['prefix'])
+            lines = [f"{label(first)} - {label(last)}: {os.path.basename(dst)}" for _, dst, first, last in results]
+            msg = f"已处理 {len(results)} 个文件 (输出在原文件旁)\n" + "\n".join(lines[:15])
+            if len(lines) > 15: msg += f"\n... 共 {len(lines)} 个"
+            self.after(0, lambda: self.finish(True, msg))
+        except Exception as e:
+            print(e)
+            err = str(e)
+            self.after(0, lambda: self.finish(False, err))
 
     def finish(self, success, msg=""):
         self.progress.stop()
-        self.btn_run.configure(state="normal", text="开始处理")
-        if success: messagebox.showinfo("完成", "成功！")
+        self.btn_run.configure(state="normal" if self.file_path else "disabled", text="开始处理")
+        self.btn_batch.configure(state="normal", text="批量连续编号 (多个文件)...")
+        if success: messagebox.showinfo("完成", f"成功！\n{msg}" if msg else "成功！")
         else: messagebox.showerror("错误", f"失败: {msg}")
 
 if __name__ == "__main__":
@@ -0,0 +1,10 @@
+"""
+iRoha 无界面处理引擎
+
+不依赖 Tk / customtkinter / tkinterdnd2，可在无界面的服务器或多进程任务中使用。
+命令行: python -m iroha --help
+"""
+from iroha.editor import PDFBackend
+from iroha.merger import MergerBackend
+from iroha.paginator import paginate
+from iroha.img2pdf import PuzzleWorker, PdfAssembler, EncoderPool, scan_images, plan_compression, build_options, images_to_pdf
@@ -0,0 +1,12 @@
+import multiprocessing
+import os
+import sys
+
+# 允许 python src/iroha 直接运行
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from iroha.cli import main
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,220 @@
+import argparse
+import json
+import os
+import sys
+
+from iroha.editor import PDFBackend
+from iroha.merger import MergerBackend
+from iroha.probe import ProbeService
+from iroha.paginator import paginate, paginate_sharded, paginate_batch, number_label, DEFAULT_OPTIONS
+from iroha.img2pdf import scan_images, build_options, images_to_pdf
+from utils import parse_page_ranges
+
+# ==============================================================================
+# 命令行入口：python -m iroha <command> ...
+# ==============================================================================
+
+POSITIONS = [f"{v}-{h}" for v in ("top", "center", "bottom") for h in ("left", "center", "right")]
+
+def parse_color(value):
+    value = value.lstrip("#")
+    if len(value) != 6:
+        raise argparse.ArgumentTypeError(f"颜色格式应为 #RRGGBB: {value}")
+    return tuple(int(value[i:i+2], 16) for i in (0, 2, 4))
+
+def parse_grid(value):
+    try:
+        rows, cols = (int(x) for x in value.lower().split("x"))
+        if rows < 1 or cols < 1: raise ValueError
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"网格格式应为 行x列 (如 2x2): {value}")
+    return rows, cols
+
+def cmd_merge(args):
+    probe_service = ProbeService()
+    try:
+        backend = MergerBackend(probe_service=probe_service)
+        backend.add_files(args.inputs)
+    finally:
+        probe_service.shutdown()
+    if not backend.file_list:
+        print("没有可合并的 PDF 文件")
+        return 1
+    if args.max_memory:
+        stats = backend.merge_streaming(args.output, max_memory_mb=args.max_memory)
+        if stats is None: return 1
+        if stats['peak_mb'] is not None: print(f"内存增量峰值 {stats['peak_mb']:.0f} MB, 分 {stats['flushes']} 批写出")
+        if stats['deduped_mb']: print(f"共享重复资源 {stats['deduped_mb']:.1f} MB")
+    elif args.jobs:
+        stats = backend.merge_parallel(args.output, max_workers=args.jobs, group_size=args.group_size)
+        if stats is None: return 1
+        for name, seconds in stats['stages']: print(f"{name}: {seconds:.2f}s")
+    elif not backend.merge(args.output):
+        return 1
+    print(f"已合并 {len(backend.file_list)} 个文件 -> {args.output}")
+    return 0
+
+STATUS_NAMES = {'ok': "完成", 'resumed': "沿用检查点", 'skipped': "已跳过", 'error': "失败", 'pending': "未处理"}
+
+def cmd_manifest(args):
+    backend = MergerBackend()
+    job = backend.load_manifest(args.manifest)
+    output = args.output or job['output']
+    success, report = backend.merge_resumable(output, group_size=job['group_size'], skip_errors=args.skip_errors,
+                                              progress=lambda done, total: print(f"\r组 {done}/{total}", end="", flush=True))
+    print()
+    counts = {}
+    for entry in report:
+        counts[entry['status']] = counts.get(entry['status'], 0) + 1
+        if entry['error']: print(f"{STATUS_NAMES[entry['status']]}: {entry['path']} ({entry['error']})")
+    print(", ".join(f"{STATUS_NAMES[k]} {v}" for k, v in counts.items()))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if not success:
+        print("合并未完成，修复后重新运行将从检查点继续")
+        return 1
+    print(f"已合并 -> {output}")
+    return 0
+
+def style_options(args):
+    return {
+        'logic_s': args.logic_start,
+        'total': args.total,
+        'tpl': args.tpl,
+        'prefix': args.prefix,
+        'size': args.size,
+        'pos': args.pos,
+        'mx': args.mx,
+        'my': args.my,
+        'rgb': args.color,
+        'bg_box': args.bg_box,
+        'clean': args.clean,
+    }
+
+def cmd_paginate(args):
+    cfg = {**style_options(args), 'start_p': args.start, 'end_p': args.end}
+    if args.jobs and args.jobs > 1:
+        stats = paginate_sharded(args.input, args.output, cfg, max_workers=args.jobs)
+    else:
+        stats = paginate(args.input, args.output, cfg)
+    print(f"原样 {stats['untouched']} 页, 包裹 {stats['wrapped']} 页, 清理 {stats['cleaned']} 页")
+    print(f"已添加页码 -> {args.output}")
+    return 0
+
+def cmd_paginate_batch(args):
+    cfg = style_options(args)
+    results = paginate_batch(args.inputs, cfg, out_dir=args.out_dir, suffix=args.suffix, max_workers=args.jobs)
+    label = lambda n: number_label(cfg['tpl'], n, cfg['prefix'])
+    for src, dst, first, last in results:
+        print(f"{label(first)}-{label(last)}: {src} -> {dst}")
+    return 0
+
+def cmd_img2pdf(args):
+    image_paths = scan_images(args.inputs)
+    if not image_paths:
+        print("没有找到图片")
+        return 1
+    rows, cols = args.grid
+    opts = build_options(target_mb=args.target_mb, image_count=len(image_paths),
+                         rows=rows, cols=cols, orientation=args.orientation, label_mode=args.label)
+    duration = images_to_pdf(image_paths, opts, args.output, max_workers=args.jobs)
+    size = os.path.getsize(args.output) / (1024*1024)
+    print(f"已生成 {args.output} ({len(image_paths)} 张, {size:.2f} MB, {duration:.2f}s)")
+    return 0
+
+def cmd_edit(args):
+    backend = PDFBackend()
+    backend.load(args.input)
+    total = len(backend.doc)
+    backend.page_mapping = parse_page_ranges(args.pages, total)
+    for spec in args.rotate:
+        angle, _, pages = spec.partition(":")
+        # 按原页旋转一次：同一页在输出顺序中出现多次时也不会叠加
+        targets = set(parse_page_ranges(pages, total)) & set(backend.page_mapping)
+        for orig_idx in sorted(targets):
+            page = backend.doc[orig_idx]
+            page.set_rotation(page.rotation + int(angle))
+    mode = backend.save(args.output, incremental=False if args.full_rewrite else None)
+    print(f"已导出 {backend.get_page_count()} 页 -> {args.output} ({'增量' if mode == 'incremental' else '完整'}保存)")
+    return 0
+
+def add_style_arguments(p):
+    p.add_argument("--logic-start", type=int, default=DEFAULT_OPTIONS['logic_s'], help="页码起始值")
+    p.add_argument("--total", type=int, default=None, help="{t} 总页数 (默认自动)")
+    p.add_argument("--tpl", default=DEFAULT_OPTIONS['tpl'], help="页码模板, 支持 {n} / {n:06} (补零) / {t}")
+    p.add_argument("--prefix", default=DEFAULT_OPTIONS['prefix'], help="页码前缀, 如 ACME-")
+    p.add_argument("--size", type=int, default=DEFAULT_OPTIONS['size'])
+    p.add_argument("--pos", choices=POSITIONS, default=DEFAULT_OPTIONS['pos'])
+    p.add_argument("--mx", type=float, default=DEFAULT_OPTIONS['mx'], help="X 偏移")
+    p.add_argument("--my", type=float, default=DEFAULT_OPTIONS['my'], help="Y 偏移")
+    p.add_argument("--color", type=parse_color, default=DEFAULT_OPTIONS['rgb'], help="#RRGGBB")
+    p.add_argument("--bg-box", action="store_true", help="加白底")
+    p.add_argument("--clean", choices=["auto", "fast", "full"], default=DEFAULT_OPTIONS['clean'],
+                   help="原内容处理: auto=仅需要时清理, fast=仅需要时包裹 q/Q, full=每页清理")
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="iroha", description="iRoha PDF Toolkit 命令行 (无界面)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("merge", help="合并多个 PDF")
+    p.add_argument("output")
+    p.add_argument("inputs", nargs="+")
+    mode = p.add_mutually_exclusive_group()
+    mode.add_argument("--max-memory", type=int, default=None, metavar="MB",
+                      help="流式合并, 限制内存上限 (适合超大批量)")
+    mode.add_argument("--jobs", type=int, default=None, help="多进程分层合并的进程数 (适合成千上万个小文件)")
+    p.add_argument("--group-size", type=int, default=64, help="分层合并每组文件数")
+    p.set_defaults(func=cmd_merge)
+
+    p = sub.add_parser("manifest", help="按 JSON 清单合并 (分组检查点, 可断点续跑)")
+    p.add_argument("manifest")
+    p.add_argument("--output", default=None, help="覆盖清单里的 output")
+    p.add_argument("--skip-errors", action="store_true", help="跳过无法读取的文件 (默认遇错停止)")
+    p.add_argument("--report", default=None, help="把每个输入的状态写入 JSON 文件")
+    p.set_defaults(func=cmd_manifest)
+
+    p = sub.add_parser("paginate", help="添加页码")
+    p.add_argument("input")
+    p.add_argument("output")
+    p.add_argument("--start", type=int, default=DEFAULT_OPTIONS['start_p'], help="起始页 (1 开始)")
+    p.add_argument("--end", type=int, default=None, help="结束页 (默认最后一页)")
+    add_style_arguments(p)
+    p.add_argument("--jobs", type=int, default=None, help="按页段分片的进程数 (大文件)")
+    p.set_defaults(func=cmd_paginate)
+
+    p = sub.add_parser("paginate-batch", help="多个文件连续编号 (Bates), 输出在原文件旁")
+    p.add_argument("inputs", nargs="+")
+    p.add_argument("--out-dir", default=None, help="输出目录 (默认与源文件同目录)")
+    p.add_argument("--suffix", default="_numbered", help="输出文件名后缀")
+    add_style_arguments(p)
+    p.add_argument("--jobs", type=int, default=None, help="并发处理的进程数")
+    p.set_defaults(func=cmd_paginate_batch)
+
+    p = sub.add_parser("img2pdf", help="图片转 PDF")
+    p.add_argument("output")
+    p.add_argument("inputs", nargs="+", help="图片文件或文件夹")
+    p.add_argument("--target-mb", type=float, default=50.0, help="目标总大小 (MB)")
+    p.add_argument("--grid", type=parse_grid, default=(1, 1), help="拼图网格, 如 2x2 (默认 1x1 标准模式)")
+    p.add_argument("--orientation", choices=["p", "l"], default="p", help="拼图纸张方向")
+    p.add_argument("--label", choices=["none", "filename", "number"], default="none")
+    p.add_argument("--jobs", type=int, default=None, help="工作进程数 (默认 CPU 核数)")
+    p.set_defaults(func=cmd_img2pdf)
+
+    p = sub.add_parser("edit", help="重排 / 删除 / 旋转页面")
+    p.add_argument("input")
+    p.add_argument("output")
+    p.add_argument("--pages", default="", help="输出页顺序, 如 3,1-2,5- (默认全部)")
+    p.add_argument("--rotate", action="append", default=[], metavar="ANGLE:PAGES",
+                   help="按原页码旋转 (顺时针), 如 90:1-3, 可重复")
+    p.add_argument("--full-rewrite", action="store_true", help="仅旋转时也完整重写 (默认增量追加)")
+    p.set_defaults(func=cmd_edit)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except Exception as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
@@ -0,0 +1,330 @@
+import os
+import shutil
+import fitz  # PyMuPDF
+from abc import ABC, abstractmethod
+from typing import List
+
+from config import EditorConfig as Config
+from utils import save_pdf_optimized, render_page_to_image, page_runs
+from iroha.thumbcache import ThumbnailCache, file_fingerprint, rotate_image
+from iroha.render import RenderService, render_preview
+
+# ==============================================================================
+# 编辑器后端 (无界面)
+# ==============================================================================
+
+# --- Command Pattern ---
+class Command(ABC):
+    """Abstract base class for undoable commands."""
+    @abstractmethod
+    def execute(self) -> None:
+        pass
+    
+    @abstractmethod
+    def undo(self) -> None:
+        pass
+
+class RotatePageCommand(Command):
+    """Command to rotate a page."""
+    def __init__(self, backend: 'PDFBackend', current_index: int, angle: int):
+        self.backend = backend
+        self.current_index = current_index
+        self.angle = angle
+    
+    def execute(self) -> None:
+        orig_idx = self.backend.get_original_index(self.current_index)
+        if orig_idx == -1: return
+        page = self.backend.doc[orig_idx]
+        page.set_rotation(page.rotation + self.angle)
+    
+    def undo(self) -> None:
+        orig_idx = self.backend.get_original_index(self.current_index)
+        if orig_idx == -1: return
+        page = self.backend.doc[orig_idx]
+        page.set_rotation(page.rotation - self.angle)
+
+class DeletePageCommand(Command):
+    """Command to delete a page (stores mapping for undo)."""
+    def __init__(self, backend: 'PDFBackend', current_index: int):
+        self.backend = backend
+        self.current_index = current_index
+        self.deleted_mapping: int = -1  # Store the original page index
+    
+    def execute(self) -> None:
+        if 0 <= self.current_index < len(self.backend.page_mapping):
+            self.deleted_mapping = self.backend.page_mapping.pop(self.current_index)
+    
+    def undo(self) -> None:
+        if self.deleted_mapping != -1:
+            self.backend.page_mapping.insert(self.current_index, self.deleted_mapping)
+
+# --- Backend ---
+class PDFBackend:
+    def __init__(self, thumb_cache: ThumbnailCache = None, render_service: RenderService = None):
+        self.doc = None
+        self.file_path = None
+        self.file_hash = None
+        self.thumb_cache = thumb_cache
+        self.render_service = render_service
+        self.page_mapping: List[int] = [] 
+        self.clipboard: List[int] = []
+        self.undo_stack: List[Command] = []
+        self.redo_stack: List[Command] = []
+
+    def load(self, path: str) -> None:
+        self.file_path = path
+        self.doc = fitz.open(path)
+        self.file_hash = file_fingerprint(path) if self.thumb_cache else None
+        self.page_mapping = list(range(len(self.doc)))
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+
+    def get_page_count(self) -> int:
+        return len(self.page_mapping) if self.doc else 0
+
+    def get_original_index(self, current_index: int) -> int:
+        if 0 <= current_index < len(self.page_mapping):
+            return self.page_mapping[current_index]
+        return -1
+
+    def is_landscape(self, current_index: int) -> bool:
+        if not self.doc: return False
+        try:
+            orig_idx = self.get_original_index(current_index)
+            page = self.doc[orig_idx]
+            rect = page.rect 
+            return rect.width > rect.height
+        except: return False
+
+    # --- Command Execution ---
+    def execute_command(self, cmd: Command) -> None:
+        """Execute a command and push to undo stack."""
+        cmd.execute()
+        self.undo_stack.append(cmd)
+        self.redo_stack.clear()  # Clear redo stack on new action
+
+    def undo(self) -> bool:
+        """Undo last command. Returns True if successful."""
+        if not self.undo_stack:
+            return False
+        cmd = self.undo_stack.pop()
+        cmd.undo()
+        self.redo_stack.append(cmd)
+        return True
+
+    def redo(self) -> bool:
+        """Redo last undone command. Returns True if successful."""
+        if not self.redo_stack:
+            return False
+        cmd = self.redo_stack.pop()
+        cmd.execute()
+        self.undo_stack.append(cmd)
+        return True
+
+    def can_undo(self) -> bool:
+        return len(self.undo_stack) > 0
+
+    def can_redo(self) -> bool:
+        return len(self.redo_stack) > 0
+
+    # --- Legacy methods (still used by cut/paste) ---
+    def rotate_page(self, current_index: int, angle: int) -> None:
+        cmd = RotatePageCommand(self, current_index, angle)
+        self.execute_command(cmd)
+
+    def delete_page(self, current_index: int) -> None:
+        cmd = DeletePageCommand(self, current_index)
+        self.execute_command(cmd)
+
+    def cut_pages(self, current_indices) -> List[int]:
+        sorted_indices = sorted(list(current_indices), reverse=True)
+        cut_items = []
+        for idx in sorted_indices:
+            if 0 <= idx < len(self.page_mapping):
+                cut_items.append(self.page_mapping.pop(idx))
+        return cut_items[::-1]
+
+    def paste_pages(self, target_current_index: int, items: List[int]) -> None:
+        for item in reversed(items):
+            self.page_mapping.insert(target_current_index, item)
+
+    def _open_copy(self, save_path: str):
+        """Independent handle on the source; rotations are the only in-memory edits."""
+        same_file = os.path.abspath(save_path) == os.path.abspath(self.file_path)
+        if not same_file and os.path.exists(self.file_path):
+            return fitz.open(self.file_path)
+        return fitz.open("pdf", self.doc.tobytes())
+
+    def changed_rotations(self) -> dict:
+        """{orig_idx: rotation} for pages whose rotation differs from the file on disk."""
+        with fitz.open(self.file_path) as src:
+            return {i: self.doc[i].rotation for i in range(len(src)) if src[i].rotation != self.doc[i].rotation}
+
+    def can_save_incremental(self) -> bool:
+        """Append-only export is possible when pages were only rotated (mapping still identity)."""
+        return (self.doc is not None and os.path.exists(self.file_path)
+                and self.page_mapping == list(range(len(self.doc)))
+                and self.doc.can_save_incrementally())
+
+    def save_incremental(self, save_path: str) -> None:
+        """
+        Write only the changed page dictionaries as an incremental update,
+        in place or appended to a byte-for-byte copy of the source.
+        """
+        changed = self.changed_rotations()
+        in_place = os.path.abspath(save_path) == os.path.abspath(self.file_path)
+        if not in_place: shutil.copyfile(self.file_path, save_path)
+        if not changed: return
+        # 始终在新句柄上追加：同一句柄连续两次原地增量保存会写出错误的 /Prev 链
+        with fitz.open(save_path) as copy:
+            for orig_idx, rotation in changed.items():
+                copy[orig_idx].set_rotation(rotation)
+            copy.save(save_path, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+        if in_place: self.reload()
+
+    def reload(self) -> None:
+        """Reopen the file after it changed on disk; page order and undo/redo history are kept."""
+        self.doc.close()
+        self.doc = fitz.open(self.file_path)
+        self.file_hash = file_fingerprint(self.file_path) if self.thumb_cache else None
+
+    def save(self, save_path: str, incremental=None) -> str:
+        """
+        Export the current page order. incremental=None picks append-only mode
+        automatically when possible; True forces it, False forces a full rewrite.
+        Returns "incremental" or "full".
+        """
+        if not self.doc: return None
+        if incremental is None: incremental = self.can_save_incremental()
+        if incremental:
+            if not self.can_save_incremental():
+                raise ValueError("页面已重排或删除，无法增量保存")
+            self.save_incremental(save_path)
+            return "incremental"
+        
+        mapping = list(self.page_mapping)
+        if len(set(mapping)) == len(mapping):
+            # 重排 / 删除：在副本上一次 select() 重写页树，并同步旋转
+            new_doc = self._open_copy(save_path)
+            for orig_idx in mapping:
+                rotation = self.doc[orig_idx].rotation
+                if new_doc[orig_idx].rotation != rotation:
+                    new_doc[orig_idx].set_rotation(rotation)
+            if mapping != list(range(len(new_doc))):
+                new_doc.select(mapping)
+            # 源文件自身的流无需再逐一比对去重 (garbage=4 会读取全部流)
+            garbage = 3
+        else:
+            # 含重复页：连续页合并为一次区间插入
+            new_doc = fitz.open()
+            for start, end in page_runs(mapping):
+                new_doc.insert_pdf(self.doc, from_page=start, to_page=end)
+            garbage = 4
+        
+        ok = save_pdf_optimized(new_doc, save_path, garbage=garbage)
+        new_doc.close()
+        if not ok: raise IOError(f"无法保存: {save_path}")
+        return "full"
+
+    # --- Thumbnails ---
+    # 渲染调度线程只使用 UI 线程在请求时拍下的快照，不访问 self.doc (UI 线程可能正在旋转或换文件)
+    def render_target(self, orig_idx: int) -> tuple:
+        """Snapshot (file_path, file_hash, page_xref, rotation) of a page; call on the UI thread."""
+        return self.file_path, self.file_hash, self.doc.page_xref(orig_idx), self.doc[orig_idx].rotation
+
+    def is_current(self, orig_idx: int, target: tuple) -> bool:
+        """True if a result rendered for target still matches the page (UI thread)."""
+        return bool(self.doc) and 0 <= orig_idx < len(self.doc) and self.render_target(orig_idx) == target
+
+    @staticmethod
+    def target_key(target: tuple, rotation: int = None) -> str:
+        _, file_hash, xref, current = target
+        return ThumbnailCache.make_key(file_hash, xref, current if rotation is None else rotation, Config.IMG_MAX_SIZE)
+
+    def cached_thumbnail(self, orig_idx: int, disk: bool = False):
+        """Cache lookup for a page's current state (UI thread), never renders."""
+        if not self.doc or orig_idx == -1: return None
+        return self.cached_target(self.render_target(orig_idx), disk)
+
+    def cached_target(self, target: tuple, disk: bool = False):
+        """
+        Cache lookup only, never renders. The memory tier is checked unless disk=True.
+        A thumbnail cached at another rotation is rotated in memory instead of re-rendered.
+        """
+        if not self.thumb_cache: return None
+        lookup = self.thumb_cache.get if disk else self.thumb_cache.peek
+        rotation = target[3]
+        key = self.target_key(target)
+        img = lookup(key)
+        if img is not None: return img
+        
+        for base_rotation in (0, 90, 180, 270):
+            if base_rotation == rotation: continue
+            base = lookup(self.target_key(target, base_rotation))
+            if base is not None:
+                img = rotate_image(base, rotation - base_rotation)
+                self.thumb_cache.remember(key, img)
+                return img
+        return None
+
+    def has_cached_thumbnail(self, orig_idx: int) -> bool:
+        """True if any rotation of this page is cached (memory or disk)."""
+        if not self.doc or orig_idx == -1 or not self.thumb_cache: return False
+        target = self.render_target(orig_idx)
+        return any(self.thumb_cache.contains(self.target_key(target, r)) for r in (0, 90, 180, 270))
+
+    def preview_thumbnails(self, targets):
+        """
+        Yield (orig_idx, image) fast first-pass previews at PREVIEW_SIZE (not cached) for
+        [(orig_idx, target), ...]. Like render_thumbnails, only the snapshots are used.
+        """
+        pages = {}
+        for orig_idx, target in targets:
+            pages.setdefault(target[0], []).append((orig_idx, target[3]))
+        for path, jobs in pages.items():
+            previews = (self.render_service.preview_many(path, jobs, Config.PREVIEW_SIZE) if self.render_service
+                        else _render_from_path(path, jobs, Config.PREVIEW_SIZE, preview=True))
+            for orig_idx, _, img in previews:
+                yield orig_idx, img
+
+    def render_thumbnail(self, orig_idx: int):
+        if not self.doc or orig_idx == -1: return None
+        if not self.thumb_cache:
+            return render_page_to_image(self.doc[orig_idx], Config.IMG_MAX_SIZE)
+        
+        img = self.cached_thumbnail(orig_idx, disk=True)
+        if img is None:
+            img = render_page_to_image(self.doc[orig_idx], Config.IMG_MAX_SIZE)
+            if img: self.thumb_cache.put(self.target_key(self.render_target(orig_idx)), img)
+        return img
+
+    def render_thumbnails(self, targets):
+        """
+        Yield (orig_idx, image) for [(orig_idx, target), ...], cache hits first. Uses only the
+        snapshots, so it is safe on the render thread. Misses go to the process-pool render
+        service when one is attached, otherwise they are rendered from a separate handle.
+        """
+        misses = {}
+        for orig_idx, target in targets:
+            img = self.cached_target(target, disk=True)
+            if img is not None: yield orig_idx, img
+            else: misses.setdefault(target[0], []).append((orig_idx, target))
+        
+        for path, pages in misses.items():
+            # 缓存键取自快照，渲染期间切换文件也不会写错键
+            keys = {orig_idx: self.target_key(target) for orig_idx, target in pages}
+            jobs = [(orig_idx, target[3]) for orig_idx, target in pages]
+            rendered = (self.render_service.render_many(path, jobs, Config.IMG_MAX_SIZE) if self.render_service
+                        else _render_from_path(path, jobs))
+            for orig_idx, _, img in rendered:
+                if self.thumb_cache: self.thumb_cache.put(keys[orig_idx], img)
+                yield orig_idx, img
+
+def _render_from_path(path: str, pages, size: int = Config.IMG_MAX_SIZE, preview: bool = False):
+    """Render [(orig_idx, rotation), ...] from a private handle; yields (orig_idx, rotation, image)."""
+    with fitz.open(path) as doc:
+        for orig_idx, rotation in pages:
+            page = doc[orig_idx]
+            if page.rotation != rotation: page.set_rotation(rotation)
+            img = render_preview(doc, orig_idx, size) if preview else render_page_to_image(page, size)
+            if img: yield orig_idx, rotation, img
@@ -0,0 +1,529 @@
+import os
+import io
+import math
+import time
+import threading
+import multiprocessing
+import concurrent.futures
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image, ImageOps
+import fitz  # PyMuPDF
+from natsort import natsorted
+from pillow_heif import register_heif_opener
+
+from config import Img2PdfConfig as Config
+from utils import save_pdf_optimized
+
+register_heif_opener()
+
+VALID_EXT = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.heic', '.webp')
+
+# EXIF Orientation -> insert_image 的 rotate (逆时针角度)；镜像类 (2/4/5/7) 不在此列，需要重新编码
+EXIF_ROTATE = {1: 0, 3: 180, 6: 270, 8: 90}
+
+def draft_jpeg(src_img, max_dim):
+    """JPEG 先按 DCT 缩放解码到不小于目标尺寸的最近 1/2^k，再做最终的 LANCZOS 缩放"""
+    w, h = src_img.size
+    if src_img.format == "JPEG" and max(w, h) > max_dim:
+        scale = max_dim / max(w, h)
+        src_img.draft(src_img.mode, (math.ceil(w * scale), math.ceil(h * scale)))
+
+# ==============================================================================
+# 核心逻辑：通用排版工作单元 (含压缩与自适应)
+# ==============================================================================
+class PuzzleWorker:
+    """
+    工作进程逐张解码/压缩图片，返回 JPEG 字节；主进程在一页的图片到齐后用 layout_page 排版，
+    PDF 由主进程中唯一的 PdfAssembler 按页序写入 (无临时 PDF、只保存一次)。
+    """
+    @staticmethod
+    def image_params(img_path, options):
+        """单张图片的 (max_dim, quality, budget_kb)：优先用压缩计划里的逐图参数"""
+        default = (options.get('max_dim', 2000), options.get('quality', 75), options.get('budget_kb'))
+        return options.get('params', {}).get(img_path, default)
+
+    @staticmethod
+    def passthrough_rotate(src_img, img_path, max_dim, budget_kb):
+        """
+        原 JPEG 无需缩放且不超出单张体积预算时，直接嵌入原始 DCT 数据 (不解码、不损失画质)。
+        返回 insert_image 的 rotate 角度 (方向由 PDF 变换矩阵完成)；不能直通时返回 None。
+        """
+        if src_img.format != "JPEG" or src_img.mode not in ("RGB", "L"): return None
+        if max(src_img.size) > max_dim: return None
+        if budget_kb is None or os.path.getsize(img_path) > budget_kb * 1024: return None
+        return EXIF_ROTATE.get(src_img.getexif().get(0x0112, 1))
+
+    @staticmethod
+    def encode_image(img_path, options):
+        """返回 (JPEG 字节, 原始尺寸, rotate)"""
+        max_dim, quality, budget_kb = PuzzleWorker.image_params(img_path, options)
+        
+        with Image.open(img_path) as src_img:
+            raw_size = src_img.size
+            rotate = PuzzleWorker.passthrough_rotate(src_img, img_path, max_dim, budget_kb)
+            if rotate is not None:
+                with open(img_path, "rb") as f:
+                    return f.read(), raw_size, rotate
+            draft_jpeg(src_img, max_dim)
+            pil_img = ImageOps.exif_transpose(src_img)
+            
+            # 核心压缩逻辑：缩放
+            w, h = pil_img.size
+            if w > max_dim or h > max_dim:
+                pil_img.thumbnail((max_dim, max_dim), Image.Resampling.LANCZOS)
+            
+            # 转字节流 (JPEG压缩)
+            if pil_img.mode not in ("RGB", "L"): pil_img = pil_img.convert("RGB")
+            img_byte_arr = io.BytesIO()
+            pil_img.save(img_byte_arr, format='JPEG', quality=quality)
+        return img_byte_arr.getvalue(), raw_size, 0
+
+    @staticmethod
+    def encode_safe(img_path, options):
+        """encode_image 的容错版本：失败时打印并返回 None (该格留空)"""
+        try:
+            return PuzzleWorker.encode_image(img_path, options)
+        except Exception as e:
+            print(f"Skip {img_path}: {e}")
+            return None
+
+    @staticmethod
+    def layout_page(batch, encoded, options, first_index=0):
+        """
+        按 rows x cols 排版一页：batch 为本页图片路径，encoded 为对应的 encode_image 结果 (None 表示跳过)，
+        first_index 为本页第一张图的全局序号 (用于 "图 N" 标签)。返回 PdfAssembler 的页记录。
+        """
+        # 解析基础参数
+        rows = options.get('rows', 1)
+        cols = options.get('cols', 1)
+        
+        # 模式判断
+        is_standard_mode = (rows == 1 and cols == 1)
+
+        # --- 页面尺寸决策 ---
+        # 默认根据 options 里的 orientation 设置
+        if options['orientation'] == 'l': 
+            pw, ph = Config.A4_H, Config.A4_W
+        else: 
+            pw, ph = Config.A4_W, Config.A4_H
+
+        # 【智能优化】标准模式下，根据第一张图自动旋转纸张
+        if is_standard_mode and len(batch) == 1 and encoded[0]:
+            img_w, img_h = encoded[0][1]
+            # 如果图片宽>高，且当前纸张是竖向，则转为横向
+            if img_w > img_h and pw < ph:
+                pw, ph = ph, pw
+            # 如果图片高>宽，且当前纸张是横向，则转为竖向
+            elif img_h > img_w and pw > ph:
+                pw, ph = ph, pw
+
+        # 计算格子参数
+        valid_w = pw - 2*Config.MARGIN
+        valid_h = ph - 2*Config.MARGIN
+        cell_w = (valid_w - (cols - 1) * Config.GAP) / cols
+        cell_h = (valid_h - (rows - 1) * Config.GAP) / rows
+
+        items = []
+        for j, (img_path, enc) in enumerate(zip(batch, encoded)):
+            if enc is None: continue
+            r, c = j // cols, j % cols
+            x0 = Config.MARGIN + c * (cell_w + Config.GAP)
+            y0 = Config.MARGIN + r * (cell_h + Config.GAP)
+            
+            img_area_h = cell_h
+            if options['label_mode'] != 'none': img_area_h -= Config.TEXT_H
+            
+            item = {'rect': (x0, y0, x0 + cell_w, y0 + img_area_h), 'path': img_path, 'image': enc[0], 'rotate': enc[2], 'label': None}
+            
+            # --- 标签 ---
+            if options['label_mode'] != 'none':
+                global_idx = first_index + j + 1
+                item['label'] = os.path.basename(img_path) if options['label_mode'] == 'filename' else f"图 {global_idx}"
+                # 文字区域
+                item['label_rect'] = (x0, y0 + img_area_h, x0 + cell_w, y0 + cell_h)
+            items.append(item)
+        
+        return {'size': (pw, ph), 'items': items}
+
+# ==============================================================================
+# 单一写入者：按页序组装最终 PDF
+# ==============================================================================
+class PdfAssembler:
+    def __init__(self):
+        self.doc = fitz.open()
+        self.pending = {}
+        self.next_chunk = 0
+        self.images = {}  # path -> (页号, xref, 字节数, rotate)
+
+    def add(self, chunk_idx, pages):
+        """接收任意顺序到达的分块 (或单页) 结果，按顺序写入已就绪的部分"""
+        self.pending[chunk_idx] = pages
+        while self.next_chunk in self.pending:
+            for record in self.pending.pop(self.next_chunk):
+                self.write_page(record)
+            self.next_chunk += 1
+
+    def write_page(self, record):
+        pw, ph = record['size']
+        page = self.doc.new_page(width=pw, height=ph)
+        for item in record['items']:
+            # 插入 PDF (居中, 保持比例)
+            xref = page.insert_image(fitz.Rect(item['rect']), stream=item['image'], keep_proportion=True, rotate=item['rotate'])
+            self.images[item['path']] = (page.number, xref, len(item['image']), item['rotate'])
+            if item['label'] is not None:
+                # 使用 insert_textbox 自动居中
+                page.insert_textbox(fitz.Rect(item['label_rect']), item['label'], fontname="china-ss", fontsize=10, align=1)
+
+    def image_sizes(self):
+        """{path: (字节数, 可否重编码)}；直通且靠 rotate 摆正的图片不能直接替换为摆正后的像素"""
+        return {p: (size, rotate == 0) for p, (_, _, size, rotate) in self.images.items()}
+
+    def replace(self, path, data):
+        """用新的 JPEG 数据原位改写图片对象 (页面上的位置与变换矩阵不变，宽高比相同)"""
+        pno, xref, _, rotate = self.images[path]
+        with Image.open(io.BytesIO(data)) as img:
+            w, h = img.size
+            colorspace = "/DeviceGray" if img.mode == "L" else "/DeviceRGB"
+        self.doc.update_stream(xref, data, compress=False)
+        self.doc.xref_set_key(xref, "Filter", "/DCTDecode")
+        self.doc.xref_set_key(xref, "Width", str(w))
+        self.doc.xref_set_key(xref, "Height", str(h))
+        self.doc.xref_set_key(xref, "ColorSpace", colorspace)
+        self.images[path] = (pno, xref, len(data), rotate)
+
+    def save(self, save_path):
+        ok = save_pdf_optimized(self.doc, save_path)
+        self.doc.close()
+        if not ok: raise IOError(f"无法保存: {save_path}")
+
+# ==============================================================================
+# 辅助函数
+# ==============================================================================
+def scan_images(paths):
+    """展开文件/文件夹，返回去重并按自然顺序排序的图片路径列表"""
+    new_paths = []
+    for p in paths:
+        if os.path.isfile(p) and p.lower().endswith(VALID_EXT): new_paths.append(p)
+        elif os.path.isdir(p):
+            for root, _, files in os.walk(p):
+                for f in files:
+                    if f.lower().endswith(VALID_EXT): new_paths.append(os.path.join(root, f))
+    return natsorted(list(set(new_paths)))
+
+def image_budget_kb(target_mb, image_count):
+    """每张图可分到的体积 (KB)，预留 10%"""
+    return target_mb * 1024 * 0.90 / max(1, image_count)
+
+def plan_compression(target_mb, image_count):
+    """
+    统一计算压缩参数：无论是拼图还是标准模式，都先算出 "每张图能分到多少KB"
+    返回 (max_dim, quality)
+    """
+    avg_kb = image_budget_kb(target_mb, image_count)
+    
+    # 分级压缩策略 (Granular Compression Scale)
+    if avg_kb < 50: return 800, 40
+    elif avg_kb < 100: return 1000, 50
+    elif avg_kb < 200: return 1500, 65
+    elif avg_kb < 500: return 2000, 75
+    else: return 2500, 85
+
+def build_options(target_mb=50.0, image_count=1, rows=1, cols=1, orientation='p', label_mode='none'):
+    """组装 render_chunk 所需的 options 字典 (rows=cols=1 即标准模式)"""
+    max_dim, quality = plan_compression(target_mb, image_count)
+    return {
+        'target_mb': target_mb,
+        'max_dim': max_dim,
+        'quality': quality,
+        'rows': rows,
+        'cols': cols,
+        'orientation': orientation,
+        'label_mode': label_mode,
+    }
+
+# ==============================================================================
+# 闭环体积控制：抽样实测 -> 拟合码率 -> 逐图分配档位 -> 超出时只重编码最大的几张
+# ==============================================================================
+# 压缩档位 (max_dim, quality)，由小到大
+LADDER = [(600, 30), (800, 40), (1000, 50), (1500, 65), (2000, 75), (2500, 85)]
+
+def image_header(path):
+    """只读文件头：(宽, 高, 文件字节, 是否 JPEG)；读不到时返回 None"""
+    try:
+        with Image.open(path) as img:
+            w, h = img.size
+            is_jpeg = img.format == "JPEG"
+        return w, h, os.path.getsize(path), is_jpeg
+    except Exception:
+        return None
+
+def level_pixels(w, h, max_dim):
+    """按 max_dim 等比缩小 (只缩不放) 后的像素数"""
+    scale = min(1.0, max_dim / max(w, h))
+    return (w * scale) * (h * scale)
+
+def sample_rates(path):
+    """把一张图按 LADDER 每一档实际编码一次，返回各档字节数；失败返回 None"""
+    try:
+        with Image.open(path) as src_img:
+            draft_jpeg(src_img, LADDER[-1][0])
+            img = ImageOps.exif_transpose(src_img)
+            if img.mode not in ("RGB", "L"): img = img.convert("RGB")
+            measured = []
+            for max_dim, quality in reversed(LADDER):
+                img.thumbnail((max_dim, max_dim), Image.Resampling.LANCZOS)
+                buf = io.BytesIO()
+                img.save(buf, format='JPEG', quality=quality)
+                measured.append(buf.tell())
+        return measured[::-1]
+    except Exception:
+        return None
+
+def fit_line(xy):
+    """最小二乘 y = a + b·x，a、b 不取负 (退化时退回过原点或常数)"""
+    n = len(xy)
+    mx = sum(x for x, _ in xy) / n
+    my = sum(y for _, y in xy) / n
+    sxx = sum((x - mx) ** 2 for x, _ in xy)
+    b = sum((x - mx) * (y - my) for x, y in xy) / sxx if sxx > 0 else 0.0
+    a = my - b * mx
+    if b < 0: return my, 0.0
+    if a < 0: return 0.0, sum(x * y for x, y in xy) / max(1e-12, sum(x * x for x, _ in xy))
+    return a, b
+
+class CompressionPlan:
+    """
+    让输出体积落在 target_mb 附近。码率模型：图片在某档的体积 ≈ (a + b × 原文件每像素字节) × 该档像素数，
+    原文件的 字节/像素 代表画面复杂度；a、b 按档位用抽样实测做最小二乘 (JPEG 与其他格式分开拟合)。
+    先找总量放得下的最高统一档位，余量再按 "升一档的代价" 从小到大分给单张图片。
+    """
+    def __init__(self, target_mb, page_count):
+        # limit: 图片可用的总字节 (扣除每页的固定开销)；aim: 规划时瞄准的值，留出误差余量
+        self.limit = target_mb * 1024 * 1024 - page_count * Config.PAGE_OVERHEAD_KB * 1024
+        self.aim = self.limit * (1 - Config.TARGET_TOLERANCE)
+        self.levels = {}   # path -> LADDER 下标
+        self.pred = {}     # path -> 各档预测字节数
+        self.source = {}   # path -> 原文件字节 (实际体积与之相同即为直通)
+        self.lowered = set()
+
+    @staticmethod
+    def pick_samples(paths, headers, k):
+        """按文件大小分位抽 k 张"""
+        by_size = sorted(paths, key=lambda p: headers[p][2])
+        k = min(k, len(by_size))
+        return [by_size[(2 * i + 1) * len(by_size) // (2 * k)] for i in range(k)]
+
+    def build(self, image_paths, executor):
+        headers = {p: h for p, h in zip(image_paths, executor.map(image_header, image_paths, chunksize=32)) if h}
+        if not headers: return
+        self.source = {p: h[2] for p, h in headers.items()}
+        top = len(LADDER) - 1
+        
+        # 原文件加起来都放得下：全部用最高档 (符合条件的 JPEG 会直通)
+        if sum(h[2] for h in headers.values()) <= self.aim:
+            for p, h in headers.items():
+                self.levels[p] = top
+                self.pred[p] = [h[2]] * len(LADDER)
+            return
+        
+        # 小批量少抽几张 (抽样本身也要编码)；JPEG 与其他格式按数量比例分别抽
+        k = min(Config.PLAN_SAMPLES, max(4, len(headers) // 8))
+        groups = {}
+        for p, h in headers.items(): groups.setdefault(h[3], []).append(p)
+        samples = []
+        for paths in groups.values():
+            samples += self.pick_samples(paths, headers, max(2, round(k * len(paths) / len(headers))))
+        
+        # 每组每档的观测点: (原文件每像素字节, 该档实测每像素字节)
+        points = {}
+        for p, measured in zip(samples, executor.map(sample_rates, samples)):
+            if not measured: continue
+            w, h, size, is_jpeg = headers[p]
+            obs = points.setdefault(is_jpeg, [[] for _ in LADDER])
+            for L, (max_dim, _) in enumerate(LADDER):
+                obs[L].append((size / (w * h), measured[L] / level_pixels(w, h, max_dim)))
+        if not points: return
+        coef = {g: [fit_line(xy) for xy in obs] for g, obs in points.items()}
+        
+        for p, (w, h, size, is_jpeg) in headers.items():
+            c = coef.get(is_jpeg) or next(iter(coef.values()))
+            self.pred[p] = [(a + b * size / (w * h)) * level_pixels(w, h, LADDER[L][0]) for L, (a, b) in enumerate(c)]
+        
+        base = 0
+        for L in range(len(LADDER)):
+            if sum(v[L] for v in self.pred.values()) <= self.aim: base = L
+        self.levels = dict.fromkeys(self.pred, base)
+        if base == top: return
+        
+        total = sum(v[base] for v in self.pred.values())
+        for p in sorted(self.pred, key=lambda p: self.pred[p][base + 1] - self.pred[p][base]):
+            extra = self.pred[p][base + 1] - self.pred[p][base]
+            if total + extra > self.aim: break
+            self.levels[p] = base + 1
+            total += extra
+
+    def params(self, paths):
+        """{path: (max_dim, quality, budget_kb)}；原 JPEG 不大于该档预测体积时直接直通"""
+        out = {}
+        for p in paths:
+            if p not in self.levels: continue
+            max_dim, quality = LADDER[self.levels[p]]
+            out[p] = (max_dim, quality, self.pred[p][self.levels[p]] / 1024)
+        return out
+
+    def second_pass(self, sizes):
+        """
+        sizes 为 {path: (实际字节, 可否重编码)}。总量超出 limit 时，从最大的图片开始逐张降一档，
+        直到预计能回到 aim 以内；总量比 limit 低出两倍容差以上时，反过来逐张升一档，直到预计到达 aim。
+        返回需要重编码的 path 列表 (其 levels 已更新)。
+        """
+        total = sum(size for size, _ in sizes.values())
+        if total > self.limit: return self._lower(sizes, total)
+        if total < self.limit * (1 - 2 * Config.TARGET_TOLERANCE): return self._raise(sizes, total)
+        return []
+
+    def _raise(self, sizes, total):
+        """
+        按实测校准升档代价：该图当前档的 实际/预测 比例同样用于上一档的预测。
+        代价小的先升 (与 build 分配余量的顺序一致)；直通的原图和降过档的图片不再升。
+        """
+        top = len(LADDER) - 1
+        costs = []
+        for p, (size, ok) in sizes.items():
+            L = self.levels.get(p)
+            if not ok or L is None or L == top or p in self.lowered or size == self.source.get(p): continue
+            up = self.pred[p][L + 1] * size / max(1, self.pred[p][L])
+            costs.append((up - size, p))
+        redo = []
+        for extra, p in sorted(costs):
+            if total + extra > self.aim: break
+            self.levels[p] += 1
+            total += extra
+            redo.append(p)
+        return redo
+
+    def _lower(self, sizes, total):
+        excess = total - self.aim
+        redo = []
+        for p in sorted(sizes, key=lambda p: -sizes[p][0]):
+            size, ok = sizes[p]
+            L = self.levels.get(p, 0)
+            if not ok or L == 0: continue
+            self.levels[p] = L - 1
+            self.lowered.add(p)
+            excess -= size * (1 - self.pred[p][L - 1] / max(1, self.pred[p][L]))
+            redo.append(p)
+            if excess <= 0: break
+        return redo
+
+# ==============================================================================
+# 常驻进程池
+# ==============================================================================
+def init_worker():
+    """
+    工作进程初始化：只加载本引擎用到的解码器 (PIL 插件 + HEIF)，不碰界面库。
+    也用作 warm() 的空任务。
+    """
+    Image.init()
+
+class EncoderPool:
+    """
+    常驻的图片编码进程池：第一次用到时才启动，之后多次导出复用同一批已完成导入的进程，
+    20~50 张的小批量不用每次重新拉起进程。由界面 (或调用方) 持有，退出时 shutdown。
+    """
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or multiprocessing.cpu_count()
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=init_worker)
+            return self.executor
+
+    def warm(self):
+        """提前拉起全部进程并完成导入 (不阻塞)，比如用户刚添加图片时"""
+        executor = self.get_executor()
+        for _ in range(self.max_workers): executor.submit(init_worker)
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
+
+# ==============================================================================
+# 执行
+# ==============================================================================
+def images_to_pdf(image_paths, opts, save_path, progress=None, max_workers=None, pool=None):
+    """
+    多进程生成 PDF。progress(fraction) 为可选进度回调。
+    pool 为可选的 EncoderPool (复用常驻进程)，否则本次临时创建进程池。
+    返回耗时 (秒)。
+    """
+    t_start = time.time()
+    try:
+        with nullcontext(pool.get_executor()) if pool else _temporary_executor(len(image_paths), max_workers) as executor:
+            _images_to_pdf(executor, image_paths, opts, save_path, progress)
+    except BrokenProcessPool:
+        # 有工作进程异常退出，常驻池已不可用：丢弃，下次导出重新创建
+        if pool: pool.shutdown()
+        raise
+    return time.time() - t_start
+
+def _temporary_executor(total_files, max_workers=None):
+    cpu_count = max_workers or multiprocessing.cpu_count()
+    if total_files < 10: cpu_count = 1
+    return ProcessPoolExecutor(max_workers=cpu_count, initializer=init_worker)
+
+def _images_to_pdf(executor, image_paths, opts, save_path, progress=None):
+    total_files = len(image_paths)
+    if 'budget_kb' not in opts: opts = {**opts, 'budget_kb': image_budget_kb(opts.get('target_mb', 50.0), total_files)}
+    
+    # 按页分组 (拼图模式一页多张)
+    items_per_page = opts['rows'] * opts['cols']
+    pages = [image_paths[i : i + items_per_page] for i in range(0, total_files, items_per_page)]
+
+    assembler = PdfAssembler()
+    plan = None
+    params = {}
+    if opts.get('target_mb'):
+        plan = CompressionPlan(opts['target_mb'], len(pages))
+        plan.build(image_paths, executor)
+        params = plan.params(image_paths)
+    
+    # 每张图片一个任务：所有进程共用进程池的任务队列，谁空闲谁领下一张，
+    # 一页大 HEIC 不会拖住一整块；某页的图片到齐即排版并交给 assembler 按页序写入
+    future_to_pos = {}
+    for pno, batch in enumerate(pages):
+        for j, img_path in enumerate(batch):
+            task_opts = {**opts, 'params': {img_path: params[img_path]} if img_path in params else {}}
+            future_to_pos[executor.submit(PuzzleWorker.encode_safe, img_path, task_opts)] = (pno, j)
+    
+    encoded = [[None] * len(batch) for batch in pages]
+    remaining = [len(batch) for batch in pages]
+    try:
+        for completed_count, f in enumerate(concurrent.futures.as_completed(list(future_to_pos)), 1):
+            pno, j = future_to_pos.pop(f)
+            encoded[pno][j] = f.result()
+            remaining[pno] -= 1
+            if remaining[pno] == 0:
+                assembler.add(pno, [PuzzleWorker.layout_page(pages[pno], encoded[pno], opts, pno * items_per_page)])
+                encoded[pno] = None
+            if progress: progress(completed_count / total_files)
+    finally:
+        # 中途出错时撤下尚未开始的任务，常驻进程池留给下一次导出
+        for f in future_to_pos: f.cancel()
+    
+    # 仍超出目标则把最大的几张降一档、明显低于目标则把升档代价小的升一档，重编码 (不直通) 后原位替换；最多补 PLAN_PASSES 轮
+    for _ in range(Config.PLAN_PASSES if plan else 0):
+        redo = plan.second_pass(assembler.image_sizes())
+        if not redo: break
+        redo_opts = [{'params': {p: (*LADDER[plan.levels[p]], 0)}} for p in redo]
+        for p, enc in zip(redo, executor.map(PuzzleWorker.encode_image, redo, redo_opts)):
+            assembler.replace(p, enc[0])
+
+    assembler.save(save_path)
@@ -0,0 +1,514 @@
+import os
+import re
+import json
+import math
+import time
+import hashlib
+import shutil
+import tempfile
+import fitz  # PyMuPDF
+from concurrent.futures import ProcessPoolExecutor
+from utils import save_pdf_optimized, current_rss_mb, parse_page_ranges, page_runs
+from iroha.probe import probe_pdf_safe
+
+# ==============================================================================
+# 跨文档资源去重：嫁接时按内容哈希索引字体 / 图片 / 色彩空间，相同资源只保留一份
+# ==============================================================================
+_REF_RE = re.compile(r"\b(\d+) 0 R\b")
+_SHARED_TYPES = ("/Font", "/FontDescriptor", "/ExtGState", "/Encoding")
+_SHARED_ARRAYS = ("[/ICCBased", "[/Indexed", "[/Separation", "[/DeviceN", "[/CalRGB", "[/CalGray", "[/Lab")
+
+class ResourceIndex:
+    """
+    每次 insert_pdf 之后调用 dedupe(first_new_xref, first_new_page)：
+    新对象中与已有资源内容相同的，引用改指向已有对象，自身置为 null。
+    页面、页树、注释等有身份语义的对象不参与合并。
+    """
+    def __init__(self, doc):
+        self.doc = doc
+        self.index = {}   # 内容哈希 -> xref
+        self.saved = 0    # 被去重的流字节数
+
+    def _is_candidate(self, xref, text, content_xrefs):
+        if self.doc.xref_is_stream(xref):
+            return xref not in content_xrefs
+        if text.startswith("<<"):
+            # 只看对象自身的 /Type：页面内联的 /Resources 里也会出现 /Type/Font，
+            # 不能据此把页面、注释 (含 Widget) 当成可合并的资源
+            return self.doc.xref_get_key(xref, "Type")[1] in _SHARED_TYPES
+        if text.startswith(_SHARED_ARRAYS): return True
+        # CIDFont 的 /W 宽度表等纯数字数组
+        return text.startswith("[") and not re.search(r"[/(<]", text)
+
+    def dedupe(self, first_xref, first_page=0):
+        doc = self.doc
+        last_xref = doc.xref_length()
+        content_xrefs = set()
+        for pno in range(first_page, doc.page_count):
+            _, value = doc.xref_get_key(doc.page_xref(pno), "Contents")
+            content_xrefs.update(int(x) for x in _REF_RE.findall(value))
+        
+        texts = {x: doc.xref_object(x, compressed=True) for x in range(first_xref, last_xref)}
+        candidates = {x for x, t in texts.items() if self._is_candidate(x, t, content_xrefs)}
+        remap = {}
+        done = set()
+        
+        def substitute(text):
+            return _REF_RE.sub(lambda m: f"{remap.get(int(m.group(1)), int(m.group(1)))} 0 R", text)
+        
+        def resolve(x, visiting):
+            # 先解析被引用的资源，保证哈希基于已重定向的引用
+            if x in done: return
+            visiting.add(x)
+            for r in (int(v) for v in _REF_RE.findall(texts[x])):
+                if r in candidates and r not in visiting: resolve(r, visiting)
+            visiting.discard(x)
+            done.add(x)
+            
+            text = substitute(texts[x])
+            h = hashlib.blake2b(text.encode("latin-1", "replace"), digest_size=16)
+            raw = doc.xref_stream_raw(x) if doc.xref_is_stream(x) else None
+            if raw is not None: h.update(raw)
+            key = h.digest()
+            canonical = self.index.get(key)
+            if canonical is not None and canonical != x:
+                remap[x] = canonical
+                if raw is not None: self.saved += len(raw)
+            else:
+                self.index[key] = x
+        
+        for x in sorted(candidates): resolve(x, set())
+        if not remap: return 0
+        
+        for x, text in texts.items():
+            if x in remap: continue
+            new_text = substitute(text)
+            if new_text == text: continue
+            if doc.xref_is_stream(x):
+                # 流对象只改字典项，保留流数据
+                for key in doc.xref_get_keys(x):
+                    kind, value = doc.xref_get_key(x, key)
+                    if kind in ("xref", "array", "dict"):
+                        new_value = substitute(value)
+                        if new_value != value: doc.xref_set_key(x, key, new_value)
+            else:
+                doc.update_object(x, new_text)
+        # 增量写出不做垃圾回收，重复对象直接置空，避免被原样写进输出
+        for x in remap: doc.update_object(x, "null")
+        return len(remap)
+
+# ==============================================================================
+# 按条目嫁接：条目可带 'range' (如 "3-10") 与 'rotate' (顺时针 90 的倍数)，
+# 在嫁接时直接选页、旋转，无需先经编辑器另存中间文件
+# ==============================================================================
+def item_runs(item, page_count, max_run=None):
+    """item 选中的页，按连续升序段 yield (start, end)，每段至多 max_run 页。"""
+    indices = parse_page_ranges(item.get('range', ''), page_count)
+    for start, end in page_runs(indices):
+        step = max_run or (end - start + 1)
+        for s in range(start, end + 1, step):
+            yield s, min(s + step, end + 1) - 1
+
+def insert_run(doc, src_doc, start, end, item):
+    """追加 src_doc 的 [start, end] 页并叠加条目旋转，返回追加的页数。"""
+    first = doc.page_count
+    doc.insert_pdf(src_doc, from_page=start, to_page=end)
+    # insert_pdf 的 rotate 参数是绝对角度，会抹掉页面原有的 /Rotate，所以逐页叠加
+    rotate = item.get('rotate', 0) % 360
+    if rotate:
+        for pno in range(first, doc.page_count):
+            page = doc[pno]
+            page.set_rotation((page.rotation + rotate) % 360)
+    return doc.page_count - first
+
+def graft_item(doc, src_doc, item):
+    """把 item 选中的页追加到 doc，返回追加的页数。"""
+    return sum(insert_run(doc, src_doc, start, end, item)
+               for start, end in item_runs(item, src_doc.page_count))
+
+def _group_key(items):
+    """组内输入 (路径、页范围、大小、修改时间) 的指纹，任一变化则该组检查点失效。"""
+    h = hashlib.blake2b(digest_size=16)
+    for item in items:
+        st = os.stat(item['path']) if os.path.exists(item['path']) else None
+        h.update(json.dumps([item['path'], item.get('range', ''), item.get('rotate', 0),
+                             st.st_size if st else None, st.st_mtime_ns if st else None]).encode())
+    return h.hexdigest()
+
+# ==============================================================================
+# 分层并行合并的工作进程：把一组文件合成一个不压缩的中间文件
+# ==============================================================================
+def _merge_group(items, out_path):
+    t0 = time.time()
+    doc = fitz.open()
+    for item in items:
+        with fitz.open(item['path']) as src_doc:
+            graft_item(doc, src_doc, item)
+    # 中间结果只求快：不做垃圾回收和重新压缩，源文件里已压缩的流原样保留
+    doc.save(out_path, garbage=0, deflate=False)
+    doc.close()
+    return time.time() - t0
+
+# ==============================================================================
+# 合并后端 (无界面)
+# ==============================================================================
+class MergerBackend:
+    def __init__(self, probe_service=None):
+        self.file_list = []
+        self.probe_service = probe_service
+        self.last_error = None
+
+    def add_pending(self, paths):
+        """
+        先按拖入顺序登记占位条目 (pages 为 None)，元数据稍后由 probe_items 补全。
+        返回新增的条目列表。
+        """
+        existing_paths = {item['path'] for item in self.file_list}
+        new_items = []
+        for path in paths:
+            if not path.lower().endswith('.pdf'): continue
+            if path in existing_paths: continue
+            existing_paths.add(path)
+            
+            item = {'path': path, 'name': os.path.basename(path), 'pages': None}
+            self.file_list.append(item)
+            new_items.append(item)
+        return new_items
+
+    def probe_items(self, items):
+        """
+        按完成顺序 yield (item, info)，失败时 info 为错误信息字符串。
+        只读不改，可在后台线程中迭代；结果交给 apply_probe 写回。
+        """
+        by_path = {item['path']: item for item in items}
+        if self.probe_service is None:
+            results = (probe_pdf_safe(path) for path in by_path)
+        else:
+            results = self.probe_service.probe_many(list(by_path))
+        for path, info in results:
+            yield by_path[path], info
+
+    def apply_probe(self, item, info):
+        """写回探测结果；读取失败的条目从列表中移除。返回是否成功。"""
+        if isinstance(info, dict):
+            item.update(info)
+            return True
+        print(f"无法读取: {item['path']} ({info})")
+        self.file_list = [x for x in self.file_list if x is not item]
+        return False
+
+    def set_item_options(self, index, page_range=None, rotate=None):
+        """设置条目的页范围 / 旋转；页范围非法时抛出 ValueError。"""
+        item = self.file_list[index]
+        if page_range is not None:
+            page_range = page_range.strip()
+            if page_range and item['pages'] is not None:
+                parse_page_ranges(page_range, item['pages'])
+            item['range'] = page_range
+        if rotate is not None:
+            item['rotate'] = rotate % 360
+
+    @staticmethod
+    def selected_pages(item):
+        if item['pages'] is None: return 0
+        try:
+            return len(parse_page_ranges(item.get('range', ''), item['pages']))
+        except ValueError:
+            return 0
+
+    def is_probing(self):
+        return any(item['pages'] is None for item in self.file_list)
+
+    def add_files(self, paths):
+        count = 0
+        for item, info in self.probe_items(self.add_pending(paths)):
+            if self.apply_probe(item, info): count += 1
+        return count
+
+    def move_item(self, from_index, to_index):
+        if from_index == to_index: return False
+        if not (0 <= from_index < len(self.file_list) and 0 <= to_index < len(self.file_list)):
+            return False
+            
+        item = self.file_list.pop(from_index)
+        self.file_list.insert(to_index, item)
+        return True
+
+    def remove_item(self, index):
+        if 0 <= index < len(self.file_list):
+            self.file_list.pop(index)
+
+    def clear_all(self):
+        self.file_list = []
+
+
+    def merge(self, save_path):
+        """失败返回 False，原因见 self.last_error。"""
+        self.last_error = None
+        if not self.file_list: return
+        merged_doc = fitz.open()
+        try:
+            for item in self.file_list:
+                with fitz.open(item['path']) as src_doc:
+                    graft_item(merged_doc, src_doc, item)
+            
+            success = save_pdf_optimized(merged_doc, save_path)
+            merged_doc.close()
+            return success
+        except Exception as e:
+            print(f"Merge Error: {e}")
+            self.last_error = str(e)
+            return False
+
+    def merge_streaming(self, save_path, max_memory_mb=1024, dedupe=True, progress=None):
+        """
+        有界内存合并：分批嫁接，每批以增量更新追加写入输出文件后关闭并重新打开，
+        已写出的对象与源文档随即释放。超大源文件按页分块处理。
+        增量写出无法事后 garbage=4 去重，dedupe 时在嫁接过程中用 ResourceIndex 共享相同资源。
+        内存按本次合并开始时的 RSS 为基线计算；超过 max_memory_mb 即中止 (删除半成品) 并报错。
+        返回 {'peak_mb' (本次合并的内存增量峰值), 'flushes', 'duration', 'deduped_mb'}，
+        失败返回 None，原因见 self.last_error。
+        """
+        self.last_error = None
+        if not self.file_list: return None
+        t0 = time.time()
+        # 进程 RSS 读不到时，用已嫁接的源文件字节数估算内存占用
+        budget = max_memory_mb * 1024 * 1024 / 4
+        tmp_path = save_path + ".part"
+        out = fitz.open()
+        resources = ResourceIndex(out) if dedupe else None
+        written = False
+        pending = 0
+        flushes = 0
+        start_rss = current_rss_mb()
+        base_rss = start_rss or 0
+        peak = 0.0
+        
+        def used_mb():
+            """相对本次合并开始时的内存增量，并更新峰值；读不到 RSS 时返回 None"""
+            nonlocal peak
+            rss = current_rss_mb()
+            if rss is None or start_rss is None: return None
+            peak = max(peak, rss - start_rss)
+            return rss - start_rss
+        
+        def flush():
+            nonlocal out, written, pending, flushes, base_rss
+            if written:
+                out.save(tmp_path, incremental=True, deflate=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+            else:
+                out.save(tmp_path, garbage=1, deflate=True)
+                written = True
+            out.close()
+            fitz.TOOLS.store_shrink(100)  # 清空 MuPDF 的对象缓存
+            out = fitz.open(tmp_path)
+            if resources: resources.doc = out
+            pending = 0
+            flushes += 1
+            base_rss = current_rss_mb() or 0
+        
+        def over_budget():
+            # 分配器未必把内存还给系统，所以看的是自上次写出以来的增长量
+            used = used_mb()
+            if used is not None:
+                if used > max_memory_mb:
+                    raise MemoryError(f"内存占用 {used:.0f} MB 超过上限 {max_memory_mb} MB")
+                if (start_rss + used - base_rss) * 1024 * 1024 >= budget: return True
+            return pending >= budget
+        
+        try:
+            for i, item in enumerate(self.file_list):
+                size = item.get('size') or os.path.getsize(item['path'])
+                with fitz.open(item['path']) as src_doc:
+                    count = src_doc.page_count
+                    chunk = max(1, math.floor(count * budget / size)) if size > budget else None
+                    for start, end in item_runs(item, count, chunk):
+                        first_xref, first_page = out.xref_length(), out.page_count
+                        insert_run(out, src_doc, start, end, item)
+                        if resources: resources.dedupe(first_xref, first_page)
+                        pending += size * (end - start + 1) / max(count, 1)
+                        if over_budget(): flush()
+                if progress: progress(i + 1, len(self.file_list))
+            
+            if pending or not written: flush()
+            out.close()
+            os.replace(tmp_path, save_path)
+        except Exception as e:
+            print(f"Merge Error: {e}")
+            self.last_error = str(e)
+            if not out.is_closed: out.close()
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+            return None
+        
+        return {'peak_mb': peak if start_rss is not None else None, 'flushes': flushes, 'duration': time.time() - t0,
+                'deduped_mb': resources.saved / (1024 * 1024) if resources else 0}
+
+    def merge_parallel(self, save_path, max_workers=None, group_size=64, progress=None):
+        """
+        分层 (tree-reduce) 合并：每 group_size 个输入在独立进程中合成中间文件，
+        中间文件再逐层分组合并，直到只剩一层，最后按顺序拼接并优化保存。输出顺序与 file_list 一致。
+        返回 {'stages': [(阶段名, 秒)], 'duration'}，失败返回 None，原因见 self.last_error。
+        """
+        self.last_error = None
+        if not self.file_list: return None
+        t0 = time.time()
+        group_size = max(2, group_size)
+        stages = []
+        tmp_dir = tempfile.mkdtemp(prefix="iroha_merge_", dir=os.path.dirname(os.path.abspath(save_path)))
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count() or 1) as executor:
+                parts = [{k: item.get(k) for k in ('path', 'range', 'rotate') if item.get(k)}
+                         for item in self.file_list]
+                level = 0
+                while len(parts) > group_size:
+                    t = time.time()
+                    groups = [parts[i:i + group_size] for i in range(0, len(parts), group_size)]
+                    outputs = [os.path.join(tmp_dir, f"L{level}_{i:05d}.pdf") for i in range(len(groups))]
+                    futures = [executor.submit(_merge_group, g, o) for g, o in zip(groups, outputs)]
+                    for i, f in enumerate(futures):
+                        f.result()
+                        if progress: progress(level, i + 1, len(futures))
+                    stages.append((f"第 {level + 1} 层: {len(parts)} -> {len(outputs)}", time.time() - t))
+                    parts = [{'path': o} for o in outputs]
+                    level += 1
+            
+            t = time.time()
+            merged_doc = fitz.open()
+            for item in parts:
+                with fitz.open(item['path']) as src_doc:
+                    graft_item(merged_doc, src_doc, item)
+            stages.append((f"拼接: {len(parts)} -> 1", time.time() - t))
+            
+            t = time.time()
+            success = save_pdf_optimized(merged_doc, save_path)
+            merged_doc.close()
+            stages.append(("保存", time.time() - t))
+            if not success: return None
+        except Exception as e:
+            print(f"Merge Error: {e}")
+            self.last_error = str(e)
+            return None
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return {'stages': stages, 'duration': time.time() - t0}
+
+    # --- 任务清单 (manifest) 与断点续跑 ---
+
+    def load_manifest(self, manifest_path):
+        """
+        读取 JSON 清单：{"output": "out.pdf", "group_size": 64,
+                         "inputs": ["a.pdf", {"path": "b.pdf", "range": "3-10", "rotate": 90}]}
+        相对路径以清单所在目录为基准。填充 file_list 并返回 {'output', 'group_size'}。
+        """
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        base = os.path.dirname(os.path.abspath(manifest_path))
+        
+        self.file_list = []
+        for entry in manifest.get('inputs', []):
+            if isinstance(entry, str): entry = {'path': entry}
+            path = os.path.join(base, entry['path'])
+            self.file_list.append({'path': path, 'name': os.path.basename(path), 'pages': None,
+                                   'range': entry.get('range', ''), 'rotate': entry.get('rotate', 0)})
+        if 'output' not in manifest: raise ValueError("清单缺少 output")
+        return {'output': os.path.join(base, manifest['output']),
+                'group_size': manifest.get('group_size', 64)}
+
+    def save_manifest(self, manifest_path, output, group_size=64):
+        manifest = {
+            'output': output,
+            'group_size': group_size,
+            'inputs': [{'path': x['path'], 'range': x.get('range', ''), 'rotate': x.get('rotate', 0)}
+                       if x.get('range') or x.get('rotate') else x['path'] for x in self.file_list],
+        }
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    def merge_resumable(self, save_path, group_size=64, skip_errors=False, progress=None):
+        """
+        分组合并并在每组完成后写检查点 (<输出>.parts/checkpoint.json)。
+        再次运行时，输入未变化且中间文件仍在的组直接复用，从第一个未完成的组继续。
+        skip_errors 为 False 时遇到坏文件即停止 (修复后重跑即可续上)，否则记录并跳过。
+        返回 (success, report)，report 为每个输入的 {'path', 'status', 'pages', 'error'}，
+        status 取 ok / resumed / skipped / error / pending。
+        """
+        work_dir = save_path + ".parts"
+        state_path = os.path.join(work_dir, "checkpoint.json")
+        os.makedirs(work_dir, exist_ok=True)
+        state = {'groups': {}}
+        if os.path.exists(state_path):
+            try:
+                with open(state_path, "r", encoding="utf-8") as f: state = json.load(f)
+            except (OSError, ValueError):
+                print(f"检查点损坏，重新开始: {state_path}")
+        
+        def write_state():
+            tmp = state_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f: json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp, state_path)
+        
+        group_size = max(1, group_size)
+        groups = [self.file_list[i:i + group_size] for i in range(0, len(self.file_list), group_size)]
+        report = [{'path': x['path'], 'status': 'pending', 'pages': 0, 'error': None} for x in self.file_list]
+        parts = []
+        
+        for gi, group in enumerate(groups):
+            base = gi * group_size
+            key = _group_key(group)
+            part_path = os.path.join(work_dir, f"part_{gi:05d}.pdf")
+            done = state['groups'].get(str(gi))
+            if done and done['key'] == key and (done['part'] is None or os.path.exists(part_path)):
+                for j, status in enumerate(done['inputs']):
+                    report[base + j].update(status)
+                    if status['status'] == 'ok': report[base + j]['status'] = 'resumed'
+                if done['part']: parts.append(part_path)
+                if progress: progress(gi + 1, len(groups))
+                continue
+            
+            # 组内状态先记在 statuses 里，中间文件和检查点写成功后才计入 report：
+            # 否则中途失败时，本组已嫁接但未落盘的输入会被误报为完成
+            doc = fitz.open()
+            statuses = []
+            for j, item in enumerate(group):
+                try:
+                    with fitz.open(item['path']) as src_doc:
+                        pages = graft_item(doc, src_doc, item)
+                    statuses.append({'status': 'ok', 'pages': pages, 'error': None})
+                except Exception as e:
+                    if not skip_errors:
+                        doc.close()
+                        report[base + j].update(status='error', error=str(e))
+                        print(f"无法读取: {item['path']} ({e})")
+                        return False, report
+                    statuses.append({'status': 'skipped', 'pages': 0, 'error': str(e)})
+            
+            has_pages = doc.page_count > 0
+            try:
+                if has_pages:
+                    doc.save(part_path + ".tmp", garbage=0, deflate=False)
+                    os.replace(part_path + ".tmp", part_path)
+                state['groups'][str(gi)] = {'key': key, 'part': os.path.basename(part_path) if has_pages else None,
+                                            'inputs': statuses}
+                write_state()
+            except Exception as e:
+                print(f"无法写出中间文件: {part_path} ({e})")
+                state['groups'].pop(str(gi), None)
+                return False, report
+            finally:
+                doc.close()
+            if has_pages: parts.append(part_path)
+            for j, status in enumerate(statuses):
+                report[base + j].update(status)
+            if progress: progress(gi + 1, len(groups))
+        
+        if not parts:
+            print("没有可合并的页面")
+            return False, report
+        merged_doc = fitz.open()
+        for path in parts:
+            with fitz.open(path) as src_doc:
+                merged_doc.insert_pdf(src_doc)
+        success = save_pdf_optimized(merged_doc, save_path)
+        merged_doc.close()
+        if success: shutil.rmtree(work_dir, ignore_errors=True)
+        return success, report
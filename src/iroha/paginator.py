@@ -0,0 +1,451 @@
+import os
+import re
+import math
+import fitz  # PyMuPDF
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from utils import save_pdf_optimized
+
+# ==============================================================================
+# 页码后端 (无界面)
+# ==============================================================================
+
+# 默认参数 (与界面初始值一致)
+DEFAULT_OPTIONS = {
+    'start_p': 1,
+    'end_p': None,      # None = 最后一页
+    'logic_s': 1,
+    'total': None,      # None = 自动 (end_p - start_p + 1)
+    'tpl': "- {n} -",   # {n} 可写成 {n:06} 补零 (Bates 编号)
+    'prefix': "",
+    'size': 12,
+    'pos': "bottom-center",
+    'mx': 20.0,
+    'my': 20.0,
+    'rgb': (0, 0, 0),
+    'bg_box': False,
+    'clean': "auto",    # auto = 仅在需要时 clean_contents；fast = 需要时只包一对 q/Q；full = 每页都清理
+}
+
+# ==============================================================================
+# 内容流分析：判断原内容结束后图形状态是否"干净"，决定盖章前是否需要包裹/清理
+# ==============================================================================
+_INLINE_IMG_RE = re.compile(rb"\bBI\b.*?\bID\b.*?\bEI\b", re.S)
+_STRING_RE = re.compile(rb"\((?:[^()\\]|\\.)*\)", re.S)
+_COMMENT_RE = re.compile(rb"%[^\r\n]*")
+_HEX_RE = re.compile(rb"<(?!<)[^<>]*>")
+_NAME_RE = re.compile(rb"/[^\s/\[\]<>(){}%]*")
+_OP_RE = re.compile(rb"[A-Za-z'\"*]+")
+# 在最外层出现就会影响后续追加内容的状态算子 (CTM、裁剪、线宽、文字状态、ExtGState 等)
+_STATE_OPS = {b"cm", b"W", b"W*", b"w", b"d", b"J", b"j", b"M", b"ri", b"i", b"gs",
+              b"Tc", b"Tw", b"Tz", b"TL", b"Tr", b"Ts"}
+
+def analyze_contents(data):
+    """
+    返回 (min_depth, end_depth, dirty)：q/Q 嵌套的最低点与结束深度，以及最外层是否残留状态算子。
+    三者分别为 0 / 0 / False 时，追加的内容无需任何包裹。
+    """
+    if b"BI" in data: data = _INLINE_IMG_RE.sub(b" ", data)
+    if b"(" in data:
+        # 字符串可嵌套括号：由内向外反复去除
+        while True:
+            stripped = _STRING_RE.sub(b" ", data)
+            if stripped == data: break
+            data = stripped
+    if b"%" in data: data = _COMMENT_RE.sub(b" ", data)
+    if b"<" in data: data = _HEX_RE.sub(b" ", data)
+    if b"/" in data: data = _NAME_RE.sub(b" ", data)
+    
+    depth = min_depth = 0
+    dirty = False
+    for op in _OP_RE.findall(data):
+        if op == b"q":
+            depth += 1
+        elif op == b"Q":
+            depth -= 1
+            if depth < min_depth: min_depth = depth
+        elif depth <= 0 and op in _STATE_OPS:
+            dirty = True
+    return min_depth, depth, dirty
+
+# ==============================================================================
+# 向量化盖章：按 (可视矩形, 旋转) 分组预计算版面；字体对象全文档只建一次；
+# 每页只写一条小内容流，不再逐页调用 get_text_length / insert_text
+# ==============================================================================
+FONT_NAME = "iRohaHelv"
+_HELV_WIDTHS = {}
+
+def text_width(text, size):
+    """Helvetica 文本宽度 (按字符缓存，结果与 fitz.get_text_length 相同)。"""
+    total = 0.0
+    for ch in text:
+        w = _HELV_WIDTHS.get(ch)
+        if w is None:
+            w = _HELV_WIDTHS[ch] = fitz.get_text_length(ch, fontname="helv", fontsize=1)
+        total += w
+    return total * size
+
+class PageLayout:
+    """同一几何 (cropbox, mediabox, rotation) 的页面共用的坐标换算。"""
+    __slots__ = ("vy", "base_x", "align", "derot", "to_pdf", "text_origin", "text_matrix")
+
+    def __init__(self, page, cfg):
+        rect = page.rect  # 可视矩形 (已旋转)
+        size = cfg['size']
+        # Y轴 (基线)
+        if "top" in cfg['pos']: self.vy = rect.y0 + cfg['my'] + size
+        elif "bottom" in cfg['pos']: self.vy = rect.y1 - cfg['my']
+        else: self.vy = rect.height/2 + cfg['my'] + size/2
+        # X轴：vx = base_x - align * 文本宽度
+        if "left" in cfg['pos']: self.base_x, self.align = rect.x0 + cfg['mx'], 0.0
+        elif "right" in cfg['pos']: self.base_x, self.align = rect.x1 - cfg['mx'], 1.0
+        else: self.base_x, self.align = rect.x0 + (rect.width/2) + cfg['mx'], 0.5
+        
+        # 可视坐标 -> 物理坐标 (MuPDF, y 向下) -> PDF 用户空间 (y 向上)
+        # 白底与 draw_rect 一致用 ~transformation_matrix；文字起点与 insert_text 一致：
+        # (x + cropbox.x, mediabox 高 - y - cropbox.y)，带 CropBox 的旋转页两者并不相同
+        self.derot = page.derotation_matrix
+        self.to_pdf = ~page.transformation_matrix
+        crop = page.cropbox_position
+        self.text_origin = fitz.Matrix(1, 0, 0, -1, crop.x, page.mediabox_size.y - crop.y)
+        # 文字随页面旋转保持正立 (等价于 insert_text(rotate=page.rotation))
+        r = page.rotation
+        cos, sin = {0: (1, 0), 90: (0, 1), 180: (-1, 0), 270: (0, -1)}[r % 360]
+        self.text_matrix = (cos, sin, -sin, cos)
+
+    def stamp(self, text, cfg):
+        """返回该页的盖章内容流 (bytes)。"""
+        size = cfg['size']
+        text_len = text_width(text, size)
+        vx = self.base_x - self.align * text_len
+        ops = ["q"]
+        if cfg['bg_box']:
+            vis_rect = fitz.Rect(vx - 4, self.vy - size - 2, vx + text_len + 4, self.vy + 4)
+            r = vis_rect * self.derot * self.to_pdf
+            ops.append(f"1 1 1 RG 1 1 1 rg {_n(r.x0)} {_n(r.y0)} {_n(r.width)} {_n(r.height)} re B")
+        p = fitz.Point(vx, self.vy) * self.derot * self.text_origin
+        a, b, c, d = self.text_matrix
+        rgb = " ".join(_n(v / 255) for v in cfg['rgb'])
+        ops.append(f"BT /{FONT_NAME} {_n(size)} Tf {rgb} rg {a} {b} {c} {d} {_n(p.x)} {_n(p.y)} Tm "
+                   f"<{text.encode('cp1252', 'replace').hex()}> Tj ET")
+        ops.append("Q")
+        return ("\n" + "\n".join(ops) + "\n").encode()
+
+def _n(v):
+    return f"{v:.3f}".rstrip("0").rstrip(".")
+
+def _ref(value):
+    return int(value.split()[0])
+
+_KIDS_RE = re.compile(r"/Kids\s*\[([^\]]*)\]")
+_GEOM_RES = [re.compile(r"/%s\s*(\[[^\]]*\]|\d+ 0 R)" % k) for k in ("MediaBox", "CropBox")] + \
+            [re.compile(r"/Rotate\s*(-?\d+|\d+ 0 R)")]
+
+def page_tree(doc):
+    """
+    一次遍历页树，按页序返回 [(page_xref, 几何键)]；几何键为 (MediaBox, CropBox, Rotate) 的原始值 (含继承)。
+    比逐页 doc[i] / page.xref 便宜：后者每次都要在页树里重新查找。页树损坏时退回逐页查找。
+    """
+    pages = []
+    def walk(xref, inherited, depth):
+        text = doc.xref_object(xref, compressed=True)
+        geom = tuple((m.group(1) if m else v) for m, v in ((r.search(text), v) for r, v in zip(_GEOM_RES, inherited)))
+        kids = _KIDS_RE.search(text)
+        if kids and depth < 64:
+            for kid in re.findall(r"(\d+) 0 R", kids.group(1)):
+                walk(int(kid), geom, depth + 1)
+        else:
+            pages.append((xref, geom))
+    try:
+        walk(_ref(doc.xref_get_key(doc.pdf_catalog(), "Pages")[1]), (None, None, None), 0)
+    except Exception:
+        pages = []
+    if len(pages) != doc.page_count:
+        pages = [(doc.page_xref(i), i) for i in range(doc.page_count)]
+    return pages
+
+class Stamper:
+    """在一个文档上批量盖章：共享字体对象，按几何缓存 PageLayout。"""
+    def __init__(self, doc, cfg):
+        self.doc = doc
+        self.cfg = cfg
+        self.pages = page_tree(doc)
+        self.layouts = {}
+        self.font_targets = set()
+        self.push_xrefs = {}   # 前置 "q" 的个数 -> 共享的内容流对象
+        self.stats = {'untouched': 0, 'wrapped': 0, 'cleaned': 0}
+        self.font_xref = doc.get_new_xref()
+        doc.update_object(self.font_xref, "<</Type/Font/Subtype/Type1/BaseFont/Helvetica/Encoding/WinAnsiEncoding>>")
+
+    def layout(self, index, page=None):
+        key = self.pages[index][1]
+        layout = self.layouts.get(key)
+        if layout is None:
+            layout = self.layouts[key] = PageLayout(page or self.doc[index], self.cfg)
+        return layout
+
+    def _register_font(self, page_xref):
+        """把共享字体登记到页面生效的 /Resources/Font (含从 /Parent 继承的情况)。"""
+        doc = self.doc
+        xref = page_xref
+        target = (page_xref, "Resources/Font/")
+        while xref:
+            kind, value = doc.xref_get_key(xref, "Resources")
+            if kind == "xref":
+                res = _ref(value)
+                fkind, fvalue = doc.xref_get_key(res, "Font")
+                target = (_ref(fvalue), "") if fkind == "xref" else (res, "Font/")
+                break
+            if kind == "dict":
+                fkind, fvalue = doc.xref_get_key(xref, "Resources/Font")
+                target = (_ref(fvalue), "") if fkind == "xref" else (xref, "Resources/Font/")
+                break
+            kind, value = doc.xref_get_key(xref, "Parent")
+            xref = _ref(value) if kind == "xref" else 0
+        if target in self.font_targets: return
+        doc.xref_set_key(target[0], target[1] + FONT_NAME, f"{self.font_xref} 0 R")
+        self.font_targets.add(target)
+
+    def _content_xrefs(self, page_xref):
+        doc = self.doc
+        kind, value = doc.xref_get_key(page_xref, "Contents")
+        if kind == "xref" and not doc.xref_is_stream(_ref(value)):
+            value = doc.xref_object(_ref(value), compressed=True)  # 间接引用的数组
+        return [int(x) for x in re.findall(r"(\d+) 0 R", value)] if kind in ("xref", "array") else []
+
+    def _new_stream(self, data):
+        xref = self.doc.get_new_xref()
+        self.doc.update_object(xref, "<<>>")
+        self.doc.update_stream(xref, data)
+        return xref
+
+    def _set_contents(self, page_xref, xrefs):
+        self.doc.xref_set_key(page_xref, "Contents", "[" + " ".join(f"{x} 0 R" for x in xrefs) + "]")
+
+    def _analyze(self, content_xrefs):
+        if not content_xrefs: return 0, 0, False
+        return analyze_contents(b"\n".join(self.doc.xref_stream(x) for x in content_xrefs))
+
+    def stamp(self, index, text):
+        xref = self.pages[index][0]
+        mode = self.cfg['clean']
+        page = None
+        contents = self._content_xrefs(xref)
+        
+        # 1. 修复图层：先分析，只有状态不干净的页才清理 (auto) 或包一对 q/Q (fast)
+        if mode == "full":
+            needs = True
+        else:
+            min_depth, end_depth, dirty = self._analyze(contents)
+            needs = min_depth < 0 or end_depth != 0 or dirty
+        
+        prefix = b""
+        if not needs:
+            self.stats['untouched'] += 1
+        elif mode == "fast":
+            # 前置 (1 - min_depth) 个 q 抵消多余的 Q，盖章前全部弹出
+            push = 1 - min_depth
+            if push not in self.push_xrefs:
+                self.push_xrefs[push] = self._new_stream(b"q\n" * push)
+            contents = [self.push_xrefs[push]] + contents
+            prefix = b"\nQ" * (push + end_depth)
+            self.stats['wrapped'] += 1
+        else:
+            page = self.doc[index]
+            try: page.clean_contents()
+            except: page.wrap_contents()
+            contents = self._content_xrefs(xref)
+            self.stats['cleaned'] += 1
+        
+        self._register_font(xref)
+        stamp = self._new_stream(prefix + self.layout(index, page).stamp(text, self.cfg))
+        self._set_contents(xref, contents + [stamp])
+
+_NUM_RE = re.compile(r"\{n(?::0(\d+))?\}")
+
+def format_label(tpl, n, total, prefix=""):
+    """渲染页码模板：{n} / {n:06} (补零) / {t}，前面加上 prefix。"""
+    text = _NUM_RE.sub(lambda m: str(n).zfill(int(m.group(1) or 0)), tpl)
+    return prefix + text.replace("{t}", str(total))
+
+def _page_text(cfg, idx, p_start, total):
+    log_num = (idx - p_start) + cfg['logic_s']
+    return format_label(cfg['tpl'], log_num, total, cfg['prefix'])
+
+def _target_range(cfg, page_count):
+    """返回 (p_start, target_pages, total)；范围为空时抛出 ValueError。"""
+    p_start = cfg['start_p'] - 1
+    p_end = (cfg['end_p'] or page_count) - 1
+    target_pages = range(p_start, min(p_end + 1, page_count))
+    if len(target_pages) == 0: raise ValueError("范围无效")
+    total = cfg['total'] if cfg['total'] is not None else len(target_pages)
+    return p_start, target_pages, total
+
+def paginate(src_path, save_path, cfg, progress=None):
+    """
+    【算法核心升级】
+    使用 Visual Rect + Derotation Matrix 解决扫描件坐标错位问题
+
+    cfg 使用与 DEFAULT_OPTIONS 相同的键；progress(fraction) 为可选进度回调。
+    返回各处理路径的页数 {'untouched', 'wrapped', 'cleaned'}。
+    """
+    cfg = {**DEFAULT_OPTIONS, **cfg}
+    doc = fitz.open(src_path)
+    try:
+        p_start, target_pages, total = _target_range(cfg, len(doc))
+        total_task = len(target_pages)
+
+        stamper = Stamper(doc, cfg)
+        for i, idx in enumerate(target_pages):
+            stamper.stamp(idx, _page_text(cfg, idx, p_start, total))
+            
+            if progress and (i % 10 == 0 or i == total_task - 1):
+                progress((i+1)/total_task)
+
+        # 共享字体后不再产生重复对象；garbage=3/4 的逐对象比对在大文件上要数秒，这里只压缩 xref
+        if not save_pdf_optimized(doc, save_path, garbage=2):
+            raise IOError(f"无法保存: {save_path}")
+        return stamper.stats
+    finally:
+        doc.close()
+
+# ==============================================================================
+# 分片并行：各进程打开同一源文件，只给自己的页段盖章，把改动过和新建的对象带回主进程；
+# 主进程把它们写回同一份源文档再保存。不拼接页面，链接、命名目标、表单、结构树都原样保留
+# ==============================================================================
+_OBJ_REF_RE = re.compile(r"(?<![\d.])(\d+) 0 R\b")
+
+def _paginate_shard(src_path, cfg, first, last):
+    """
+    给 [first, last] 页盖章，返回 (页数, stats, 字体 xref, 源 xref 数, [(xref, 对象, 原始流或 None)])。
+    对象列表只含改动过的源对象 (MuPDF 记在增量区里) 和新建对象，流保持编码后的原样。
+    """
+    doc = fitz.open(src_path)
+    try:
+        p_start, _, total = _target_range(cfg, len(doc))
+        base = doc.xref_length()
+        stamper = Stamper(doc, cfg)
+        for idx in range(first, last + 1):
+            stamper.stamp(idx, _page_text(cfg, idx, p_start, total))
+        pdf = fitz.mupdf.pdf_document_from_fz_document(doc.this)
+        xrefs = [x for x in range(1, base) if fitz.mupdf.pdf_xref_is_incremental(pdf, x)]
+        xrefs += range(base, doc.xref_length())
+        objects = [(x, doc.xref_object(x, compressed=True), doc.xref_stream_raw(x) if doc.xref_is_stream(x) else None)
+                   for x in xrefs]
+    finally:
+        doc.close()
+    return last - first + 1, stamper.stats, stamper.font_xref, base, objects
+
+def _apply_shards(doc, results):
+    """
+    把各分片的对象写回 doc：新建对象重新分配 xref (字体全文档只留一个)，源对象原位覆盖。
+    两个分片对同一源对象写出不同内容时返回 False。
+    """
+    pdf = fitz.mupdf.pdf_document_from_fz_document(doc.this)
+    base = doc.xref_length()
+    font = None
+    written = {}
+    for _, _, font_xref, shard_base, objects in results:
+        if shard_base != base: return False
+        mapping = {}
+        for x, _, _ in objects:
+            if x >= base:
+                mapping[x] = font if x == font_xref and font else doc.get_new_xref()
+        new_font = font is None
+        font = mapping[font_xref]
+        remap = lambda m: f"{mapping.get(int(m.group(1)), m.group(1))} 0 R"
+        for x, text, stream in objects:
+            if x == font_xref and not new_font: continue
+            text = _OBJ_REF_RE.sub(remap, text)
+            if x < base:
+                if written.setdefault(x, (text, stream)) != (text, stream): return False
+            target = mapping.get(x, x)
+            doc.update_object(target, text)
+            if stream is not None:
+                fitz.mupdf.pdf_update_stream(pdf, fitz.mupdf.pdf_new_indirect(pdf, target, 0),
+                                             fitz.mupdf.fz_new_buffer_from_copied_data(stream), 1)
+    return True
+
+def paginate_sharded(src_path, save_path, cfg, max_workers=None, progress=None):
+    """
+    与 paginate 结果一致的多进程版本：目标页段按进程数分片，改动在主进程写回同一份源文档。
+    页数太少、源文件需要修复 (各进程的对象编号不可靠)，或两个分片改写同一对象时冲突，都退回单进程。
+    """
+    cfg = {**DEFAULT_OPTIONS, **cfg}
+    max_workers = max_workers or os.cpu_count() or 1
+    with fitz.open(src_path) as src:
+        _, target_pages, _ = _target_range(cfg, len(src))
+        if max_workers < 2 or len(target_pages) < 2 * max_workers or src.is_repaired:
+            return paginate(src_path, save_path, cfg, progress)
+    
+    step = math.ceil(len(target_pages) / max_workers)
+    shards = [(first, min(first + step, target_pages.stop) - 1) for first in range(target_pages.start, target_pages.stop, step)]
+    done = 0
+    stats = {'untouched': 0, 'wrapped': 0, 'cleaned': 0}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_paginate_shard, src_path, cfg, first, last) for first, last in shards]
+        for f in as_completed(futures):
+            pages, shard_stats = f.result()[:2]
+            done += pages
+            for k, v in shard_stats.items(): stats[k] += v
+            if progress: progress(done / len(target_pages) * 0.9)
+        results = [f.result() for f in futures]
+    
+    doc = fitz.open(src_path)
+    try:
+        applied = _apply_shards(doc, results)
+        del results
+        if applied and not save_pdf_optimized(doc, save_path, garbage=2):
+            raise IOError(f"无法保存: {save_path}")
+    finally:
+        doc.close()
+    if not applied: return paginate(src_path, save_path, cfg, progress)
+    if progress: progress(1.0)
+    return stats
+
+# ==============================================================================
+# 批量连续编号 (Bates)：多个文件共用一套 {n} / {t}，并发处理，输出放在原文件旁
+# ==============================================================================
+def count_pages(path):
+    """只解析 xref 与页树根的 /Count，不加载页面。"""
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+def batch_output_path(path, out_dir=None, suffix="_numbered"):
+    stem, _ = os.path.splitext(os.path.basename(path))
+    return os.path.join(out_dir or os.path.dirname(os.path.abspath(path)), f"{stem}{suffix}.pdf")
+
+def number_label(tpl, n, prefix=""):
+    """只渲染模板中的 {n} (保留补零) 并加前缀，用于 Bates 区间摘要，如 ACME-000001。"""
+    m = _NUM_RE.search(tpl)
+    return format_label(m.group(0) if m else "{n}", n, None, prefix)
+
+def paginate_batch(paths, cfg, out_dir=None, suffix="_numbered", prefixes=None, max_workers=None, progress=None):
+    """
+    按 paths 顺序给整套文件连续编号：{n} 从 cfg['logic_s'] 起跨文件递增，{t} 为全部页数之和
+    (cfg['total'] 可覆盖)。prefixes 可为每个文件指定前缀，否则统一用 cfg['prefix']。
+    每个文件整本编号 (忽略 start_p / end_p)。返回 [(src, dst, 首号, 末号)]。
+    """
+    cfg = {**DEFAULT_OPTIONS, **cfg}
+    if out_dir: os.makedirs(out_dir, exist_ok=True)
+    dsts = [batch_output_path(path, out_dir, suffix) for path in paths]
+    for path, dst in zip(paths, dsts):
+        if os.path.abspath(dst) == os.path.abspath(path): raise ValueError(f"输出会覆盖源文件: {path}")
+    # 页数在编号的同一趟里读取 (只读 /Count)；只有模板用到 {t} 才需要先数完全部文件
+    counts = [count_pages(path) for path in paths] if cfg['total'] is None and "{t}" in cfg['tpl'] else None
+    total = sum(counts) if counts else cfg['total']
+    
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count() or 1) as executor:
+        jobs = []
+        n = cfg['logic_s']
+        for i, (path, dst) in enumerate(zip(paths, dsts)):
+            count = counts[i] if counts else count_pages(path)
+            if count == 0: continue
+            file_cfg = {**cfg, 'start_p': 1, 'end_p': None, 'logic_s': n, 'total': total}
+            if prefixes: file_cfg['prefix'] = prefixes[i]
+            jobs.append((executor.submit(paginate, path, dst, file_cfg), (path, dst, n, n + count - 1)))
+            n += count
+        
+        for done, f in enumerate(as_completed([f for f, _ in jobs]), 1):
+            f.result()
+            if progress: progress(done / len(jobs))
+    return [info for _, info in jobs]
@@ -0,0 +1,69 @@
+import os
+import hashlib
+import fitz  # PyMuPDF
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# ==============================================================================
+# PDF 元数据探测：只读 trailer / 页树根 (/Count) 和第一页，不遍历整份文档
+# ==============================================================================
+
+def probe_pdf(path):
+    """
+    读取 {'path', 'name', 'pages', 'size', 'encrypted', 'fingerprint'}。
+    加密文件 pages 为 0；fingerprint 为首页 MediaBox + 内容流的短哈希，可用于查重。
+    """
+    info = {
+        'path': path,
+        'name': os.path.basename(path),
+        'pages': 0,
+        'size': os.path.getsize(path),
+        'encrypted': False,
+        'fingerprint': None,
+    }
+    with fitz.open(path) as doc:
+        if not doc.is_pdf: raise ValueError("不是 PDF 文件")
+        if doc.needs_pass:
+            info['encrypted'] = True
+            return info
+        info['pages'] = doc.page_count
+        if doc.page_count:
+            page = doc[0]
+            h = hashlib.blake2b(digest_size=8)
+            h.update(str(tuple(page.mediabox)).encode())
+            h.update(page.read_contents())
+            info['fingerprint'] = h.hexdigest()
+    return info
+
+def probe_pdf_safe(path):
+    """返回 (path, info)；读取失败时 info 为错误信息字符串。"""
+    try:
+        return path, probe_pdf(path)
+    except Exception as e:
+        return path, str(e)
+
+class ProbeService:
+    """进程池探测：MuPDF 解析时持有 GIL，放在子进程里才不会卡住界面线程。"""
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+        self.executor = None
+
+    def _get_executor(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self.executor
+
+    def probe_many(self, paths):
+        """按完成顺序 yield probe_pdf_safe 的结果。"""
+        if not paths: return
+        executor = self._get_executor()
+        futures = [executor.submit(probe_pdf_safe, p) for p in paths]
+        try:
+            for f in as_completed(futures):
+                yield f.result()
+        finally:
+            for f in futures: f.cancel()
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
@@ -0,0 +1,319 @@
+import os
+import io
+import time
+import heapq
+import itertools
+import threading
+from collections import deque
+import fitz  # PyMuPDF
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory, resource_tracker
+from PIL import Image
+
+from utils import render_page_to_pixmap, render_page_to_image
+
+# ==============================================================================
+# 多进程缩略图渲染服务
+# 每个工作进程持有自己的只读文档句柄；像素通过共享内存回传，避免 pickle 大块数据。
+# ==============================================================================
+
+_worker_doc = None
+_worker_path = None
+
+def _open_worker_doc(path):
+    global _worker_doc, _worker_path
+    if _worker_path != path:
+        if _worker_doc is not None: _worker_doc.close()
+        _worker_doc = fitz.open(path)
+        _worker_path = path
+    return _worker_doc
+
+def _render_pages(path, pages, max_size, shm_name, slot_size):
+    """
+    工作进程：渲染 [(orig_idx, rotation), ...] 并写入共享内存的对应槽位。
+    返回 [(orig_idx, rotation, width, height)]，失败的页 width 为 0。
+    """
+    doc = _open_worker_doc(path)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    results = []
+    try:
+        for slot, (orig_idx, rotation) in enumerate(pages):
+            try:
+                page = doc[orig_idx]
+                # 编辑器里的旋转只存在于主进程内存中，这里同步到本进程的句柄
+                if page.rotation != rotation: page.set_rotation(rotation)
+                pix = render_page_to_pixmap(page, max_size)
+                samples = pix.samples_mv if hasattr(pix, "samples_mv") else pix.samples
+                if len(samples) > slot_size: raise ValueError("pixmap exceeds slot")
+                offset = slot * slot_size
+                shm.buf[offset:offset + len(samples)] = samples
+                results.append((orig_idx, rotation, pix.width, pix.height))
+            except Exception as e:
+                print(f"Error rendering page {orig_idx}: {e}")
+                results.append((orig_idx, rotation, 0, 0))
+    finally:
+        shm.close()
+    return results
+
+# ==============================================================================
+# 快速预览：内嵌缩略图 / 整页扫描图 (JPEG 降采样解码)，否则极小尺寸渲染
+# ==============================================================================
+def _embedded_image_xref(doc, page):
+    kind, value = doc.xref_get_key(page.xref, "Thumb")
+    if kind == "xref":
+        return int(value.split()[0])
+    
+    # 扫描件：单张图片且宽高比与页面一致 (不解析内容流，保持廉价)
+    images = page.get_images()
+    if len(images) != 1: return 0
+    xref, _, width, height = images[0][:4]
+    rect = page.cropbox
+    if not (width and height and rect.width and rect.height): return 0
+    if abs(width / height - rect.width / rect.height) <= 0.05 * (rect.width / rect.height):
+        return xref
+    return 0
+
+def render_preview(doc, page_index, preview_size):
+    """Cheap low-resolution preview of a page (PIL Image or None)."""
+    page = doc[page_index]
+    try:
+        xref = _embedded_image_xref(doc, page)
+        info = doc.extract_image(xref) if xref else None
+        if info and info.get("ext") in ("jpeg", "jpg"):
+            img = Image.open(io.BytesIO(info["image"]))
+            img.draft("RGB", (preview_size, preview_size))
+            img = img.convert("RGB")
+            img.thumbnail((preview_size, preview_size))
+            if page.rotation: img = img.rotate(-page.rotation, expand=True)
+            return img
+    except Exception as e:
+        print(f"Embedded preview failed for page {page_index}: {e}")
+    return render_page_to_image(page, preview_size)
+
+def _preview_pages(path, pages, preview_size):
+    """
+    工作进程：快速预览 [(orig_idx, rotation), ...]。预览只有几十像素，PIL 图像直接随结果返回。
+    返回 [(orig_idx, rotation, PIL Image 或 None)]。
+    """
+    doc = _open_worker_doc(path)
+    results = []
+    for orig_idx, rotation in pages:
+        try:
+            page = doc[orig_idx]
+            if page.rotation != rotation: page.set_rotation(rotation)
+            results.append((orig_idx, rotation, render_preview(doc, orig_idx, preview_size)))
+        except Exception as e:
+            print(f"Error previewing page {orig_idx}: {e}")
+            results.append((orig_idx, rotation, None))
+    return results
+
+class RenderService:
+    def __init__(self, max_workers=None, batch_size=16):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.executor = None
+
+    def _get_executor(self):
+        if self.executor is None:
+            # 先在主进程启动 resource_tracker，工作进程继承它；否则先于共享内存启动的工作进程
+            # 会各自起一个 tracker，退出时把仍由主进程持有的段当作泄漏清理掉
+            resource_tracker.ensure_running()
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self.executor
+
+    def render_many(self, path, pages, max_size):
+        """
+        渲染 [(orig_idx, rotation), ...]，按批次完成顺序逐个 yield (orig_idx, rotation, PIL Image)。
+        共享内存由主进程分配并持有，直到结果读出 (Windows 上段随最后一个句柄关闭而释放)。
+        """
+        if not pages: return
+        executor = self._get_executor()
+        slot_size = (max_size + 2) * (max_size + 2) * 3
+        future_to_shm = {}
+        try:
+            for i in range(0, len(pages), self.batch_size):
+                batch = pages[i:i + self.batch_size]
+                shm = shared_memory.SharedMemory(create=True, size=slot_size * len(batch))
+                f = executor.submit(_render_pages, path, batch, max_size, shm.name, slot_size)
+                future_to_shm[f] = shm
+
+            for f in as_completed(future_to_shm):
+                shm = future_to_shm.pop(f)
+                try:
+                    for slot, (orig_idx, rotation, w, h) in enumerate(f.result()):
+                        if not w: continue
+                        offset = slot * slot_size
+                        img = Image.frombytes("RGB", (w, h), bytes(shm.buf[offset:offset + w * h * 3]))
+                        yield orig_idx, rotation, img
+                finally:
+                    shm.close()
+                    shm.unlink()
+        finally:
+            # 调用方提前结束迭代时，等待并释放剩余批次的共享内存
+            for f, shm in future_to_shm.items():
+                try: f.result()
+                except Exception: pass
+                shm.close()
+                shm.unlink()
+
+    def preview_many(self, path, pages, preview_size):
+        """快速预览 [(orig_idx, rotation), ...]，按批次完成顺序逐个 yield (orig_idx, rotation, PIL Image)。"""
+        if not pages: return
+        executor = self._get_executor()
+        futures = [executor.submit(_preview_pages, path, pages[i:i + self.batch_size], preview_size)
+                   for i in range(0, len(pages), self.batch_size)]
+        for f in as_completed(futures):
+            for orig_idx, rotation, img in f.result():
+                if img is not None: yield orig_idx, rotation, img
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+# ==============================================================================
+# 渲染调度器：优先级队列 + 去重 + 取消 (编辑器唯一的渲染入口)
+# ==============================================================================
+class _RenderRequest:
+    __slots__ = ("orig_idx", "target", "priority", "submitted", "cancelled")
+
+    def __init__(self, orig_idx, target, priority, submitted):
+        self.orig_idx = orig_idx
+        self.target = target          # UI 线程拍下的 (file_path, file_hash, xref, rotation)
+        self.priority = priority
+        self.submitted = submitted
+        self.cancelled = False
+
+class RenderScheduler:
+    # 优先级 (数值越小越先处理)
+    VISIBLE = 0
+    ACTED = 1
+    # 阶段：同一优先级内，先给所有请求出预览，再逐个升级为全尺寸
+    STAGE_PREVIEW = 0
+    STAGE_FULL = 1
+
+    def __init__(self, backend, on_result, on_status=None, batch_size=16):
+        """
+        on_result(orig_idx, image, preview, target) 与 on_status(stats) 在调度线程中调用；
+        调度线程只使用请求时的快照，结果是否仍然有效由 UI 线程用 target 判断
+        """
+        self.backend = backend
+        self.on_result = on_result
+        self.on_status = on_status
+        self.batch_size = batch_size
+        self.heap = []           # (priority, stage, seq, request)
+        self.entries = {}        # orig_idx -> 当前有效的请求 (含处理中的)
+        self.seq = itertools.count()
+        self.cond = threading.Condition()
+        self.latencies = deque(maxlen=100)
+        self.completed = 0
+        self.superseded = 0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    # --- 提交 / 取消 ---
+    def request(self, orig_idx, priority):
+        """请求渲染某页的当前状态 (在 UI 线程调用)；同页同状态去重，旧状态的请求被取消"""
+        target = self.backend.render_target(orig_idx)
+        with self.cond:
+            current = self.entries.get(orig_idx)
+            if current and not current.cancelled:
+                if current.target == target and current.priority <= priority:
+                    return False
+                current.cancelled = True
+                if current.target != target: self.superseded += 1
+            submitted = current.submitted if current and current.target == target else time.monotonic()
+            req = _RenderRequest(orig_idx, target, priority, submitted)
+            self.entries[orig_idx] = req
+            heapq.heappush(self.heap, (priority, self.STAGE_PREVIEW, next(self.seq), req))
+            self.cond.notify()
+        return True
+
+    def retain_visible(self, orig_indices):
+        """取消已离开可视区的 VISIBLE 请求 (ACTED 请求保留)"""
+        keep = set(orig_indices)
+        with self.cond:
+            for orig_idx, req in list(self.entries.items()):
+                if req.priority == self.VISIBLE and orig_idx not in keep:
+                    req.cancelled = True
+                    del self.entries[orig_idx]
+
+    def clear(self):
+        with self.cond:
+            for req in self.entries.values(): req.cancelled = True
+            self.entries.clear()
+            self.heap.clear()
+
+    def stats(self):
+        with self.cond:
+            depth = sum(1 for r in self.entries.values() if not r.cancelled)
+            recent = list(self.latencies)
+        return {
+            'depth': depth,
+            'completed': self.completed,
+            'superseded': self.superseded,
+            'avg_latency_ms': 1000 * sum(recent) / len(recent) if recent else 0.0,
+            'max_latency_ms': 1000 * max(recent) if recent else 0.0,
+        }
+
+    # --- 调度线程 ---
+    def _next_batch(self):
+        with self.cond:
+            while True:
+                batch = []
+                while self.heap and len(batch) < self.batch_size:
+                    item = heapq.heappop(self.heap)
+                    if item[3].cancelled: continue
+                    if batch and item[:2] != batch[0][:2]:
+                        heapq.heappush(self.heap, item)
+                        break
+                    batch.append(item)
+                if batch: return batch[0][1], [item[3] for item in batch]
+                self.cond.wait()
+
+    def _run(self):
+        while True:
+            stage, batch = self._next_batch()
+            try:
+                if stage == self.STAGE_PREVIEW: self._preview_stage(batch)
+                else: self._full_stage(batch)
+            except Exception as e:
+                print(f"Render error: {e}")
+                self._finish(batch)
+            if self.on_status: self.on_status(self.stats())
+
+    def _preview_stage(self, batch):
+        misses = {}
+        for req in batch:
+            if req.cancelled: continue
+            img = self.backend.cached_target(req.target, disk=True)
+            if img:
+                self._deliver(req, img)
+                self._finish([req])
+            else:
+                misses[req.orig_idx] = req
+        # 预览同样在渲染进程里完成，调度线程不接触 UI 线程的文档
+        for orig_idx, img in self.backend.preview_thumbnails([(o, req.target) for o, req in misses.items()]):
+            self._deliver(misses[orig_idx], img, preview=True)
+        with self.cond:
+            for req in misses.values():
+                if not req.cancelled:
+                    heapq.heappush(self.heap, (req.priority, self.STAGE_FULL, next(self.seq), req))
+
+    def _full_stage(self, batch):
+        by_idx = {req.orig_idx: req for req in batch if not req.cancelled}
+        for orig_idx, img in self.backend.render_thumbnails([(o, req.target) for o, req in by_idx.items()]):
+            if img: self._deliver(by_idx[orig_idx], img)
+        self._finish(batch)
+
+    def _deliver(self, req, img, preview=False):
+        with self.cond:
+            if req.cancelled or self.entries.get(req.orig_idx) is not req: return
+            if not preview:
+                self.latencies.append(time.monotonic() - req.submitted)
+                self.completed += 1
+        self.on_result(req.orig_idx, img, preview, req.target)
+
+    def _finish(self, batch):
+        with self.cond:
+            for req in batch:
+                if self.entries.get(req.orig_idx) is req: del self.entries[req.orig_idx]
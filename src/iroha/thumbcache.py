@@ -0,0 +1,150 @@
+import os
+import sys
+import hashlib
+import threading
+from collections import OrderedDict
+from PIL import Image
+
+# ==============================================================================
+# 缩略图缓存：内存前置层 (条目数上限) + 磁盘层 (字节预算, LRU 淘汰)
+# ==============================================================================
+
+def default_cache_dir():
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "iroha_pdf_tools", "thumbs")
+
+def file_fingerprint(path, edge=64 * 1024):
+    """
+    缓存用的文件指纹：大小 + mtime_ns + 首尾各 64 KiB 的哈希。
+    只读两小块，打开几百 MB 的扫描件也不会卡住界面线程。
+    """
+    st = os.stat(path)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{st.st_size}:{st.st_mtime_ns}".encode())
+    with open(path, "rb") as f:
+        h.update(f.read(edge))
+        if st.st_size > edge:
+            f.seek(max(edge, st.st_size - edge))
+            h.update(f.read(edge))
+    return h.hexdigest()
+
+def rotate_image(img, angle):
+    """按 PDF /Rotate 语义 (顺时针, 90° 的倍数) 旋转图像，只做像素重排"""
+    angle %= 360
+    if angle == 90: return img.transpose(Image.Transpose.ROTATE_270)
+    if angle == 180: return img.transpose(Image.Transpose.ROTATE_180)
+    if angle == 270: return img.transpose(Image.Transpose.ROTATE_90)
+    return img
+
+class ThumbnailCache:
+    EXT = ".png"
+
+    def __init__(self, cache_dir=None, max_bytes=256 * 1024 * 1024, max_entries=300):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.memory = OrderedDict()   # key -> PIL Image
+        self.disk = OrderedDict()     # key -> 文件字节数 (最旧在前)
+        self.disk_bytes = 0
+        self.lock = threading.Lock()
+        self._scan_disk()
+
+    @staticmethod
+    def make_key(file_hash, xref, rotation, size):
+        return f"{file_hash}_{xref}_{rotation % 360}_{size}"
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + self.EXT)
+
+    def _scan_disk(self):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith(self.EXT): continue
+                st = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((st.st_mtime, name[:-len(self.EXT)], st.st_size))
+        except OSError as e:
+            print(f"Thumbnail cache unavailable: {e}")
+            return
+        for _, key, size in sorted(entries):
+            self.disk[key] = size
+            self.disk_bytes += size
+        with self.lock:
+            self._evict_disk()
+
+    # --- 查询 ---
+    def peek(self, key):
+        """只查内存层 (适合在 UI 线程调用)"""
+        with self.lock:
+            img = self.memory.get(key)
+            if img is not None: self.memory.move_to_end(key)
+            return img
+
+    def contains(self, key):
+        with self.lock:
+            return key in self.memory or key in self.disk
+
+    def get(self, key):
+        img = self.peek(key)
+        if img is not None: return img
+
+        with self.lock:
+            if key not in self.disk: return None
+            self.disk.move_to_end(key)
+        path = self._path(key)
+        try:
+            with Image.open(path) as f:
+                img = f.convert("RGB")
+            os.utime(path)  # 刷新 LRU 顺序, 下次启动仍有效
+        except OSError:
+            with self.lock:
+                self.disk_bytes -= self.disk.pop(key, 0)
+            return None
+        with self.lock:
+            self._remember(key, img)
+        return img
+
+    # --- 写入 ---
+    def put(self, key, img):
+        with self.lock:
+            self._remember(key, img)
+            if key in self.disk: return
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            img.save(tmp_path, format="PNG")
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            print(f"Error writing thumbnail cache: {e}")
+            return
+        with self.lock:
+            self.disk_bytes += size - self.disk.pop(key, 0)
+            self.disk[key] = size
+            self._evict_disk()
+
+    def remember(self, key, img):
+        """只放入内存层 (用于可廉价重建的派生图)"""
+        with self.lock:
+            self._remember(key, img)
+
+    def _remember(self, key, img):
+        self.memory[key] = img
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def _evict_disk(self):
+        while self.disk_bytes > self.max_bytes and self.disk:
+            key, size = self.disk.popitem(last=False)
+            self.disk_bytes -= size
+            try: os.remove(self._path(key))
+            except OSError: pass
+
+    def clear_memory(self):
+        with self.lock:
+            self.memory.clear()
@@ -1,32 +1,91 @@
 
+import os
 import fitz
 from PIL import Image
 
-def save_pdf_optimized(doc, path):
+def save_pdf_optimized(doc, path, garbage=4):
     """
     Save PDF with optimization (garbage collection and deflation).
+    garbage=4 also de-duplicates streams, which means reading every stream of a file-backed doc.
     """
     try:
-        doc.save(path, garbage=4, deflate=True)
+        doc.save(path, garbage=garbage, deflate=True)
         return True
     except Exception as e:
         print(f"Error saving PDF: {e}")
         return False
 
+def render_page_to_pixmap(page, max_size):
+    """
+    Render a PyMuPDF page to an RGB Pixmap, constrained by max_size (longest side).
+    """
+    rect = page.rect
+    zoom = max_size / max(rect.height, rect.width)
+    zoom = min(zoom, 2.0) # Limit max zoom to avoid excessive memory on small pages
+    
+    mat = fitz.Matrix(zoom, zoom)
+    return page.get_pixmap(matrix=mat, alpha=False)
+
 def render_page_to_image(page, max_size):
     """
     Render a PyMuPDF page to a PIL Image, constrained by max_size (longest side).
     """
     try:
-        rect = page.rect
-        zoom = max_size / max(rect.height, rect.width)
-        zoom = min(zoom, 2.0) # Limit max zoom to avoid excessive memory on small pages
-        
-        mat = fitz.Matrix(zoom, zoom)
-        pix = page.get_pixmap(matrix=mat, alpha=False)
-        
+        pix = render_page_to_pixmap(page, max_size)
         img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
         return img
     except Exception as e:
         print(f"Error rendering page: {e}")
         return None
+
+def parse_page_ranges(spec, page_count):
+    """
+    Parse a 1-based page range spec like "1-3,5,8-" into 0-based page indices.
+    Ranges may be descending ("5-3"); an empty or "all" spec selects every page.
+    """
+    spec = (spec or "").strip()
+    if not spec or spec.lower() == "all":
+        return list(range(page_count))
+    
+    indices = []
+    for part in spec.replace("，", ",").split(","):
+        part = part.strip()
+        if not part: continue
+        if "-" in part:
+            a, b = part.split("-", 1)
+            start = int(a) if a.strip() else 1
+            end = int(b) if b.strip() else page_count
+        else:
+            start = end = int(part)
+        if not (1 <= start <= page_count and 1 <= end <= page_count):
+            raise ValueError(f"页码超出范围: {part}")
+        step = 1 if end >= start else -1
+        indices.extend(range(start - 1, end - 1 + step, step))
+    return indices
+
+def page_runs(indices):
+    """
+    Group page indices into ascending consecutive runs: [3,4,5,9,1,2] -> [(3,5),(9,9),(1,2)].
+    """
+    runs = []
+    for idx in indices:
+        if runs and idx == runs[-1][1] + 1:
+            runs[-1][1] = idx
+        else:
+            runs.append([idx, idx])
+    return [tuple(r) for r in runs]
+
+def current_rss_mb():
+    """
+    Resident set size of this process in MB, or None if the platform offers no cheap way to read it.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        return None